@@ -0,0 +1,508 @@
+"""
+Offline benchmark for the scrape -> generate -> draft pipeline.
+
+Runs JobPipeline against local stand-ins for the portfolio page fetch, the
+OpenAI chat endpoint and the Gmail drafts endpoint, so no API keys or network
+are needed. Latency, failure rate and quota errors of each stand-in are
+configurable, portfolio pages are synthetic HTML of any size, and every run
+uses a fixed seed so results can be compared between commits or settings.
+
+Example:
+    python bench_pipeline.py --sizes 50 500 --workers 1 5 10 --llm-latency 0.5 --json results.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import deque
+from types import SimpleNamespace
+from typing import Dict, List
+
+import httplib2
+import httpx
+import openai
+import requests
+from googleapiclient.errors import HttpError
+
+import internship_agent
+
+PROFILE = {
+    'name': 'Alex Doe',
+    'degree': 'Computer Science',
+    'graduation_year': '2026',
+    'skills': 'Python, distributed systems, React',
+    'achievements': 'Won a hackathon, published a research paper',
+    'location': 'San Francisco, CA'
+}
+
+
+class LatencyModel:
+    """Sleeps for a jittered latency and decides whether a call fails or hits a quota"""
+    def __init__(self, latency: float, jitter: float, failure_rate: float, quota_rate: float, seed: int):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.quota_rate = quota_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def next_outcome(self) -> str:
+        """Sleep for one call and return 'ok', 'failure' or 'quota'"""
+        with self.lock:
+            self.calls += 1
+            delay = max(0.0, self.random.gauss(self.latency, self.latency * self.jitter))
+            roll = self.random.random()
+        time.sleep(delay)
+        if roll < self.quota_rate:
+            return 'quota'
+        if roll < self.quota_rate + self.failure_rate:
+            return 'failure'
+        return 'ok'
+
+
+def make_portfolio_html(companies: int, style: str, padding_kb: int, seed: int) -> str:
+    """
+    Synthetic portfolio page. 'links' pages link each company to its own domain (the
+    local parser handles them); 'text' pages only name the companies, so extraction
+    needs the LLM. Script/style padding imitates real pages' boilerplate.
+    """
+    rng = random.Random(seed)
+    industries = ['AI', 'Fintech', 'Developer Tools', 'Healthcare', 'Climate', 'Security']
+    cards = []
+    for i in range(companies):
+        name = f"Company {i}"
+        industry = rng.choice(industries)
+        if style == 'links':
+            cards.append(
+                f'<div class="card"><a href="https://company{i}.com/?ref=vc">'
+                f'<img alt="{name} logo"><h3>{name}</h3></a><p>{industry} startup</p></div>'
+            )
+        else:
+            cards.append(f'<div class="card"><h3>{name}</h3><p>{industry} startup, company{i}.com</p></div>')
+    padding = '<script>' + 'var x = "boilerplate";' * (padding_kb * 1024 // 22) + '</script>'
+    return (
+        '<html><head><title>Portfolio</title><style>.card{margin:0}</style>' + padding + '</head><body>'
+        '<nav><a href="/about">About</a><a href="https://twitter.com/vc">Twitter</a></nav>'
+        + ''.join(cards) + '</body></html>'
+    )
+
+
+class FakeResponse:
+    def __init__(self, url: str, text: str, status_code: int = 200):
+        self.url = url
+        self.text = text
+        self.status_code = status_code
+        self.headers = {'ETag': f'"{hash(text)}"'}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error for {self.url}")
+
+
+class FakeHTTPSession:
+    """Stands in for requests.Session.get, serving the same synthetic page for every URL"""
+    def __init__(self, html: str, model: LatencyModel):
+        self.html = html
+        self.model = model
+
+    def get(self, url, headers=None, timeout=None):
+        outcome = self.model.next_outcome()
+        if outcome == 'quota':
+            return FakeResponse(url, '', 429)
+        if outcome == 'failure':
+            return FakeResponse(url, '', 503)
+        return FakeResponse(url, self.html)
+
+
+class FakeChatCompletions:
+    """
+    Stands in for openai.chat.completions. Extraction prompts get back the companies
+    named in the prompt as a JSON array; email prompts get a fixed-length email.
+    Supports stream=True and with_raw_response. With rpm set, requests over that
+    many in a rolling minute are rejected with 429 and every response carries
+    x-ratelimit-* headers, like the real endpoint.
+    """
+    def __init__(self, model: LatencyModel, email_words: int, rpm: int = None):
+        self.model = model
+        self.email_words = email_words
+        self.rpm = rpm
+        self.sent = deque()
+        self.lock = threading.Lock()
+        self.rejected = 0
+        self.with_raw_response = SimpleNamespace(create=self.create_raw)
+
+    def check_rate_limit(self) -> Dict:
+        """Admit or reject one request against the rolling-minute limit; returns the response headers"""
+        if not self.rpm:
+            return {}
+        with self.lock:
+            now = time.monotonic()
+            while self.sent and now - self.sent[0] >= 60:
+                self.sent.popleft()
+            admitted = len(self.sent) < self.rpm
+            if admitted:
+                self.sent.append(now)
+            else:
+                self.rejected += 1
+            reset = 60 - (now - self.sent[0]) if self.sent else 0
+            headers = {
+                'x-ratelimit-limit-requests': str(self.rpm),
+                'x-ratelimit-remaining-requests': str(self.rpm - len(self.sent)),
+                'x-ratelimit-reset-requests': f"{reset:.3f}s",
+            }
+        if not admitted:
+            headers['retry-after'] = f"{reset:.3f}"
+            request = httpx.Request('POST', 'https://api.openai.com/v1/chat/completions')
+            raise openai.RateLimitError("Rate limit reached for requests",
+                                        response=httpx.Response(429, headers=headers, request=request), body=None)
+        return headers
+
+    def create_raw(self, **request):
+        headers = self.check_rate_limit()
+        response = self.create(**request)
+        return SimpleNamespace(headers=headers, parse=lambda: response)
+
+    def create(self, model, messages, temperature=None, max_tokens=None, stream=False, stream_options=None):
+        outcome = self.model.next_outcome()
+        request = httpx.Request('POST', 'https://api.openai.com/v1/chat/completions')
+        if outcome == 'quota':
+            raise openai.RateLimitError("Rate limit reached", body=None,
+                                        response=httpx.Response(429, headers={'retry-after': '1'}, request=request))
+        if outcome == 'failure':
+            raise openai.InternalServerError("Server error", response=httpx.Response(500, request=request), body=None)
+
+        prompt = messages[-1]['content']
+        if 'portfolio companies' in prompt:
+            names = sorted(set(re.findall(r'Company (\d+)', prompt)), key=int)
+            content = '[\n' + ',\n'.join(
+                json.dumps({"name": f"Company {i}", "website": f"https://company{i}.com", "industry": "AI",
+                            "location": "San Francisco, CA"})
+                for i in names
+            ) + '\n]'
+        else:
+            content = ' '.join(['word'] * self.email_words)
+        # Like the real endpoint, stop at max_tokens (4 characters per token here)
+        finish_reason = 'stop'
+        if max_tokens and len(content) > max_tokens * 4:
+            content = content[:max_tokens * 4]
+            finish_reason = 'length'
+
+        usage = SimpleNamespace(prompt_tokens=sum(len(m['content']) for m in messages) // 4,
+                                completion_tokens=len(content) // 4)
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content),
+                                                            finish_reason=finish_reason)], usage=usage)
+
+        def chunks():
+            for word in content.split(' '):
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + ' '))], usage=None)
+            yield SimpleNamespace(choices=[], usage=usage)
+        return chunks()
+
+
+class FakeFiles:
+    def __init__(self):
+        self.store = {}
+
+    def create(self, file, purpose):
+        file_id = f"file-{len(self.store)}"
+        self.store[file_id] = file.read().decode('utf-8')
+        return SimpleNamespace(id=file_id)
+
+    def content(self, file_id):
+        return SimpleNamespace(text=self.store[file_id])
+
+
+class FakeBatches:
+    """Stands in for the OpenAI Batch API: every request is answered by FakeChatCompletions"""
+    def __init__(self, files: FakeFiles, completions: FakeChatCompletions, polls_until_done: int = 2):
+        self.files = files
+        self.completions = completions
+        self.polls_until_done = polls_until_done
+        self.batches = {}
+
+    def create(self, input_file_id, endpoint, completion_window):
+        batch_id = f"batch-{len(self.batches)}"
+        self.batches[batch_id] = {'input': input_file_id, 'polls': 0}
+        return SimpleNamespace(id=batch_id, status='validating')
+
+    def retrieve(self, batch_id):
+        batch = self.batches[batch_id]
+        batch['polls'] += 1
+        if batch['polls'] < self.polls_until_done:
+            return SimpleNamespace(id=batch_id, status='in_progress', request_counts=None)
+        if 'output' not in batch:
+            lines = []
+            for line in self.files.store[batch['input']].splitlines():
+                request = json.loads(line)
+                try:
+                    response = self.completions.create(**request['body'])
+                    body = {'choices': [{'message': {'content': response.choices[0].message.content}}],
+                            'usage': vars(response.usage)}
+                    lines.append({'custom_id': request['custom_id'], 'error': None,
+                                  'response': {'status_code': 200, 'body': body}})
+                except openai.APIStatusError as e:
+                    lines.append({'custom_id': request['custom_id'], 'error': None,
+                                  'response': {'status_code': e.status_code, 'body': {'error': str(e)}}})
+            output_id = f"file-{len(self.files.store)}"
+            self.files.store[output_id] = '\n'.join(json.dumps(line) for line in lines)
+            batch['output'] = output_id
+        return SimpleNamespace(id=batch_id, status='completed', output_file_id=batch['output'], error_file_id=None)
+
+
+class FakeOpenAI:
+    """Module-shaped stand-in for openai: chat.completions, files, batches and the error types"""
+    RateLimitError = openai.RateLimitError
+    APIStatusError = openai.APIStatusError
+    APIError = openai.APIError
+    APIConnectionError = openai.APIConnectionError
+    InternalServerError = openai.InternalServerError
+
+    def __init__(self, model: LatencyModel, email_words: int, rpm: int = None):
+        self.chat = SimpleNamespace(completions=FakeChatCompletions(model, email_words, rpm))
+        self.files = FakeFiles()
+        self.batches = FakeBatches(self.files, self.chat.completions)
+
+
+class FakeDraftRequest:
+    def __init__(self, service, body):
+        self.service = service
+        self.body = body
+
+    def execute(self):
+        return self.service.respond(self.service.model.next_outcome())
+
+
+class FakeBatchRequest:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        # One HTTP round trip for the whole batch; each part can still fail on its own
+        time.sleep(self.service.model.latency)
+        for request_id, request in self.requests:
+            with self.service.model.lock:
+                roll = self.service.model.random.random()
+            outcome = 'quota' if roll < self.service.model.quota_rate else (
+                'failure' if roll < self.service.model.quota_rate + self.service.model.failure_rate else 'ok')
+            try:
+                self.callback(request_id, self.service.respond(outcome, sleep=False), None)
+            except HttpError as e:
+                self.callback(request_id, None, e)
+
+
+class FakeGmailService:
+    """Stands in for the Gmail API service: users().drafts().create() and batch requests"""
+    def __init__(self, model: LatencyModel):
+        self.model = model
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def users(self):
+        return self
+
+    def drafts(self):
+        return self
+
+    def create(self, userId, body):
+        return FakeDraftRequest(self, body)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatchRequest(self, callback)
+
+    def respond(self, outcome: str, sleep: bool = True):
+        if outcome == 'quota':
+            raise HttpError(httplib2.Response({'status': 429}), b'{"error": {"message": "Rate Limit Exceeded"}}')
+        if outcome == 'failure':
+            raise HttpError(httplib2.Response({'status': 400}), b'{"error": {"message": "Invalid to header"}}')
+        with self.lock:
+            self.created += 1
+            return {'id': f"r-{self.created}", 'message': {'id': f"m-{self.created}"}}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def make_pipeline(workdir: str, args, html: str, seed: int):
+    """A JobPipeline whose cache, tracker, journal and metrics live in workdir and whose backends are stand-ins"""
+    os.environ['CACHE_PATH'] = os.path.join(workdir, 'cache.db')
+    os.environ['TRACKER_PATH'] = os.path.join(workdir, 'applications.db')
+    os.environ['METRICS_PATH'] = os.path.join(workdir, 'metrics.jsonl')
+    os.environ['JOURNAL_PATH'] = os.path.join(workdir, 'runs.db')
+    pipeline = internship_agent.JobPipeline()
+    pipeline.user_info = dict(PROFILE)
+    pipeline.http_session = FakeHTTPSession(html, LatencyModel(
+        args.http_latency, args.jitter, args.http_failure_rate, 0.0, seed))
+    pipeline.host_throttle = internship_agent.HostThrottle(delay=args.host_delay)
+    # The stand-ins aren't bound by a real account's limits unless --llm-rpm says so
+    pipeline.rate_limiter = internship_agent.RateLimiter(args.limit_scale)
+    pipeline.gmail_service = FakeGmailService(LatencyModel(
+        args.gmail_latency, args.jitter, args.gmail_failure_rate, args.gmail_quota_rate, seed + 1))
+    internship_agent.openai = FakeOpenAI(LatencyModel(
+        args.llm_latency, args.jitter, args.llm_failure_rate, args.llm_quota_rate, seed + 2), args.email_words, args.llm_rpm)
+    return pipeline
+
+
+def measure(name: str, items_label: str, func) -> Dict:
+    """Run func() once under tracemalloc; func returns (items processed, per-item latencies)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    items, latencies = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'stage': name,
+        'items': items,
+        'items_label': items_label,
+        'seconds': round(elapsed, 4),
+        'throughput': round(items / elapsed, 2) if elapsed else 0.0,
+        'p50_seconds': round(percentile(latencies, 0.5), 4),
+        'p95_seconds': round(percentile(latencies, 0.95), 4),
+        'peak_memory_mb': round(peak / (1024 * 1024), 2),
+    }
+
+
+def stage_result(stage: str, events: List[Dict]) -> Dict:
+    """Per-call latency of one pipeline stage, read from the metrics it recorded"""
+    latencies = [e['seconds'] for e in events if e['stage'] == stage]
+    busy = sum(latencies)
+    return {
+        'stage': f"  {stage}",
+        'items': len(latencies),
+        'items_label': 'calls',
+        'seconds': round(busy, 4),
+        'throughput': round(len(latencies) / busy, 2) if busy else 0.0,
+        'p50_seconds': round(percentile(latencies, 0.5), 4),
+        'p95_seconds': round(percentile(latencies, 0.95), 4),
+        'peak_memory_mb': None,
+    }
+
+
+def run_scenario(args, companies: int, workers: int, seed: int) -> List[Dict]:
+    """Benchmark scrape, generate and draft once for one portfolio size and worker count"""
+    html = make_portfolio_html(companies, args.page_style, args.padding_kb, seed)
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    try:
+        pipeline = make_pipeline(workdir, args, html, seed)
+        pipeline.email_workers = workers
+        pipeline.metrics.start_run(f"bench-{companies}-{workers}")
+        state = {}
+
+        def scrape():
+            start = time.perf_counter()
+            startups = pipeline.scrape_vc_startups('https://vc.example.com/portfolio')
+            state['startups'] = startups
+            return len(startups), [time.perf_counter() - start]
+
+        def generate():
+            emails = pipeline.generate_emails_concurrently(
+                state['startups'],
+                on_token=(lambda startup, text: None) if args.stream else None
+            )
+            state['emails'] = emails
+            return len(emails), [e['seconds'] for e in pipeline.metrics.events if e['stage'] == 'generate_llm']
+
+        def generate_batch():
+            emails = pipeline.generate_emails_batch(state['startups'], os.path.join(workdir, 'batch_state.json'),
+                                                    client=internship_agent.openai, poll_interval=0)
+            state['emails'] = emails
+            return len(emails), [e['seconds'] for e in pipeline.metrics.events if e['stage'] == 'openai_batch']
+
+        def drafts():
+            summary = pipeline.create_gmail_drafts_batch(state['emails'], batch_size=args.draft_batch_size)
+            return len(summary['succeeded']), [e['seconds'] for e in pipeline.metrics.events if e['stage'] == 'gmail_batch']
+
+        results = [measure('scrape_vc_startups', 'startups', scrape)]
+        # Page fetches and LLM extraction calls have very different latencies, so each gets its own row
+        results.extend(stage_result(stage, pipeline.metrics.events) for stage in ('fetch', 'extract_llm'))
+        if args.batch:
+            results.append(measure('generate_emails_batch', 'emails', generate_batch))
+        else:
+            results.append(measure('search_startups_and_generate_emails', 'emails', generate))
+        results.append(measure('create_all_drafts', 'drafts', drafts))
+
+        tokens = pipeline.metrics.summary()
+        for result in results:
+            result.update({'companies': companies, 'workers': workers})
+        results[-1]['llm_rejected_429'] = internship_agent.openai.chat.completions.rejected
+        results[-1]['throttled_seconds'] = round(sum(stats['throttled_seconds'] for stats in tokens.values()), 2)
+        results[-1]['llm_tokens'] = sum(stats['prompt_tokens'] + stats['completion_tokens'] for stats in tokens.values())
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against local stand-ins for HTTP, OpenAI and Gmail.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 500], help="companies per synthetic portfolio page")
+    parser.add_argument('--workers', type=int, nargs='+', default=[5], help="email worker counts to compare")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per setting (each with its own seed)")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--page-style', choices=['links', 'text'], default='links',
+                        help="'links' pages are parsed locally; 'text' pages need LLM extraction")
+    parser.add_argument('--padding-kb', type=int, default=100, help="script boilerplate added to each page")
+    parser.add_argument('--jitter', type=float, default=0.2, help="latency standard deviation as a fraction of the mean")
+    parser.add_argument('--http-latency', type=float, default=0.2)
+    parser.add_argument('--http-failure-rate', type=float, default=0.0)
+    parser.add_argument('--host-delay', type=float, default=0.0, help="polite delay between requests to one host")
+    parser.add_argument('--llm-latency', type=float, default=0.3)
+    parser.add_argument('--llm-failure-rate', type=float, default=0.0)
+    parser.add_argument('--llm-quota-rate', type=float, default=0.0)
+    parser.add_argument('--llm-rpm', type=int, help="requests per minute the stand-in accepts before returning 429s")
+    parser.add_argument('--limit-scale', type=float, default=1000.0,
+                        help="multiplier on the client-side OpenAI rate limits (1 = the real account defaults)")
+    parser.add_argument('--email-words', type=int, default=200)
+    parser.add_argument('--stream', action='store_true', help="generate emails with streaming responses")
+    parser.add_argument('--batch', action='store_true', help="generate emails through the stand-in Batch API")
+    parser.add_argument('--gmail-latency', type=float, default=0.2)
+    parser.add_argument('--gmail-failure-rate', type=float, default=0.0)
+    parser.add_argument('--gmail-quota-rate', type=float, default=0.0)
+    parser.add_argument('--draft-batch-size', type=int, default=internship_agent.DRAFT_BATCH_SIZE)
+    parser.add_argument('--retry-delay', type=float, default=0.05, help="base backoff for Gmail retries")
+    parser.add_argument('--json', metavar='PATH', help="also write all results to a JSON file")
+    args = parser.parse_args(argv)
+
+    internship_agent.DRAFT_RETRY_BASE_DELAY = args.retry_delay
+    results = []
+    for companies in args.sizes:
+        for workers in args.workers:
+            for run in range(args.repeat):
+                seed = args.seed + run
+                print(f"Running {companies} companies, {workers} workers, seed {seed}...")
+                results.extend(run_scenario(args, companies, workers, seed))
+
+    print()
+    print(f"{'stage':<38}{'companies':>10}{'workers':>8}{'items':>7}{'seconds':>9}{'items/s':>9}"
+          f"{'p50':>8}{'p95':>8}{'peak MB':>9}")
+    for result in results:
+        print(f"{result['stage']:<38}{result['companies']:>10}{result['workers']:>8}{result['items']:>7}"
+              f"{result['seconds']:>9.2f}{result['throughput']:>9.1f}{result['p50_seconds']:>8.3f}"
+              f"{result['p95_seconds']:>8.3f}"
+              + (f"{result['peak_memory_mb']:>9.1f}" if result['peak_memory_mb'] is not None else f"{'-':>9}"))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2)
+        print(f"\nWrote results to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,29 +1,1152 @@
 import os
-import openai
 from dotenv import load_dotenv
-from datetime import datetime
-import tkinter as tk
-from tkinter import ttk, messagebox
-import requests
+from datetime import datetime, timezone
+try:
+    import tkinter as tk
+    from tkinter import ttk, messagebox, filedialog
+except ImportError:  # headless installs without Tk; only --headless works there
+    tk = ttk = messagebox = filedialog = None
 from typing import List, Dict
 import json
 import base64
+import argparse
+import sys
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from email.mime.text import MIMEText
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 import pickle
+import queue
+import threading
+import sqlite3
+import hashlib
+import re
+from contextlib import contextmanager
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
 
 # Gmail API scopes
 SCOPES = ['https://www.googleapis.com/auth/gmail.compose']
+# Saved Gmail credentials, refreshed in the background this long before they expire
+TOKEN_PATH = 'token.pickle'
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+TOKEN_REFRESH_RETRY_SECONDS = 60
 
-class NewGradJobAgent:
+# openai takes about a second to import, so it is loaded on first use (see load_openai);
+# requests and the Google client libraries are imported inside the methods that need them
+openai = None
+
+def load_openai():
+    global openai
+    if openai is None:
+        import openai as openai_module
+        # RateLimiter owns all backoff; the SDK's own retries would resend outside its token buckets
+        openai_module.max_retries = 0
+        openai = openai_module
+    return openai
+
+# Cold email generation. In 'pitch' mode one candidate pitch is written per profile
+# and only a short company-specific paragraph is generated per startup
+# (override with EMAIL_MODE=pitch in .env)
+EMAIL_MODEL = "gpt-3.5-turbo"
+# Batch mode (headless --batch): where progress is saved so a crashed run can resume,
+# and how often to check on the submitted batch
+BATCH_STATE_PATH = 'batch_state.json'
+BATCH_POLL_SECONDS = 60
+# Consecutive connection/server errors tolerated while polling before giving up (the state file stays)
+BATCH_MAX_ERRORS = 10
+# Bump when the email prompts change so previously cached emails are regenerated
+EMAIL_PROMPT_VERSION = 2
+EMAIL_MODES = ('full', 'pitch')
+
+# Number of cold emails generated in parallel (override with EMAIL_WORKERS in .env)
+DEFAULT_EMAIL_WORKERS = 5
+
+# Gmail draft pipeline: drafts per batch HTTP request (Gmail allows up to 100,
+# but recommends 50 or fewer) and retry policy for quota and server errors
+DRAFT_BATCH_SIZE = 50
+DRAFT_MAX_RETRIES = 5
+DRAFT_RETRY_BASE_DELAY = 1.0
+RETRYABLE_HTTP_STATUSES = (429, 500, 502, 503, 504)
+
+# Local cache for fetched portfolio pages and LLM extraction results
+CACHE_PATH = 'agent_cache.db'
+PAGE_FRESH_SECONDS = 60 * 60  # serve pages without touching the network for an hour
+CACHE_TTL_SECONDS = 7 * 24 * 60 * 60  # drop entries not used for a week
+CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Portfolio extraction: the page is reduced to visible text and links, then split
+# into chunks of at most this many tokens (estimated at 4 characters per token).
+# Chunks are also sized by their output: each company comes back as one compact
+# JSON object of about EXTRACTION_TOKENS_PER_COMPANY tokens, and a chunk of
+# EXTRACTION_CHUNK_LINES lines must fit in EXTRACTION_MAX_TOKENS even when every
+# line is a company. A response that is still cut off is split and retried.
+EXTRACTION_CHUNK_TOKENS = 2000
+CHARS_PER_TOKEN = 4
+EXTRACTION_MAX_TOKENS = 2000
+EXTRACTION_TOKENS_PER_COMPANY = 40
+EXTRACTION_CHUNK_LINES = EXTRACTION_MAX_TOKENS // EXTRACTION_TOKENS_PER_COMPANY
+EXTRACTION_MAX_SPLITS = 3
+EXTRACTION_WORKERS = 4
+
+# Local portfolio parsing: outbound links that never point at a portfolio company
+NON_COMPANY_DOMAINS = {
+    'twitter.com', 'x.com', 'linkedin.com', 'facebook.com', 'instagram.com', 'youtube.com',
+    'youtu.be', 'medium.com', 'substack.com', 'tiktok.com', 'github.com', 'google.com',
+    'apple.com', 'apps.apple.com', 'podcasts.apple.com', 'spotify.com', 'open.spotify.com',
+    'vimeo.com', 'wikipedia.org', 'en.wikipedia.org', 'crunchbase.com', 'glassdoor.com',
+    'bit.ly', 'goo.gl', 'greenhouse.io', 'boards.greenhouse.io', 'jobs.lever.co', 'lever.co',
+    'calendly.com', 'bloomberg.com', 'techcrunch.com', 'forbes.com', 'nytimes.com',
+    'wsj.com', 'cnbc.com', 'nasdaq.com', 'reuters.com', 'businessinsider.com', 'axios.com',
+}
+# Hosting platforms whose subdomains belong to different companies, e.g. foo.vercel.app
+# and bar.vercel.app; root_domain keeps the company's label instead of collapsing them
+SHARED_HOSTING_SUFFIXES = {
+    'vercel.app', 'netlify.app', 'github.io', 'gitlab.io', 'herokuapp.com', 'pages.dev', 'workers.dev',
+    'web.app', 'firebaseapp.com', 'appspot.com', 'azurewebsites.net', 'cloudfront.net', 'amplifyapp.com',
+    'onrender.com', 'fly.dev', 'railway.app', 'replit.app', 'glitch.me', 'webflow.io', 'framer.website',
+    'framer.ai', 'wixsite.com', 'squarespace.com', 'myshopify.com', 'wordpress.com', 'blogspot.com',
+    'notion.site', 'super.site', 'carrd.co', 'typedream.app', 'bubbleapps.io',
+}
+# Link text that says nothing about the company, e.g. "Visit website ->"
+GENERIC_LINK_TEXT = re.compile(r'^(visit|website|visit website|learn more|read more|more|view|go|open|site|→|↗|»|->)\W*$', re.I)
+# Fewer companies than this from local parsing means we ask the LLM instead
+LOCAL_MIN_COMPANIES = 5
+# Local parsing is only trusted when most company links share one repeated card/list layout
+LOCAL_MIN_LAYOUT_SHARE = 0.5
+# ...and site extract rules only when most of the companies they find come with a website
+LOCAL_MIN_WEBSITE_SHARE = 0.8
+
+def company_page_extractor(path_pattern: str):
+    """
+    SITE_RULES extract hook for directories where each company card links to the
+    company's own page on the VC's site, e.g. /companies/<slug>.
+    """
+    path = re.compile(path_pattern)
+
+    def extract(agent, page, vc_website):
+        return agent.extract_startups_from_company_pages(page, vc_website, path)
+    return extract
+
+# Per-site tweaks for the local parser, keyed by the VC's domain. Supported options:
+#   ignore_domains - outbound domains on that site that are not portfolio companies
+#   min_companies  - confidence threshold overriding LOCAL_MIN_COMPANIES
+#   extract        - callable(agent, page, vc_website) -> List[Dict] replacing the link heuristics
+#                    (when it finds nothing the link heuristics run as usual)
+# Add an entry here to support a new VC site.
+SITE_RULES = {
+    'sequoiacap.com': {
+        'ignore_domains': {'sequoia.com', 'arc.sequoiacap.com', 'sequoiacap.com.cn'},
+        'extract': company_page_extractor(r'^/companies/(?P<slug>[^/?#]+)/?$'),
+    },
+    'ycombinator.com': {
+        'ignore_domains': {'news.ycombinator.com', 'startupschool.org', 'workatastartup.com',
+                           'bookface.ycombinator.com', 'paulgraham.com'},
+        # Directory filters live under /companies too and are not companies
+        'extract': company_page_extractor(
+            r'^/companies/(?!(?:industry|location|batch|founders|black-founders|hispanic-latino-founders|'
+            r'women-founders|breakthrough|export)(?:/|$))(?P<slug>[^/?#]+)/?$'),
+        # The YC directory lists hundreds of companies; a handful of links means it didn't render
+        'min_companies': 20,
+    },
+    'a16z.com': {
+        'ignore_domains': {'future.com', 'a16zcrypto.com', 'a16z.news', 'speedrun.a16z.com'},
+        'extract': company_page_extractor(r'^/portfolio/(?P<slug>[^/?#]+)/?$'),
+    },
+}
+
+# Application tracker: every startup found, email generated and draft created
+# (override the location with TRACKER_PATH in .env)
+TRACKER_PATH = 'applications.db'
+STATUS_FOUND = 'Not Applied'
+STATUS_GENERATED = 'Email Generated'
+STATUS_DRAFTED = 'Draft Created'
+STATUS_FAILED = 'Failed'
+# Any other status (Draft Created, Applied, Interviewing, ... from the spreadsheet) means already contacted
+NOT_CONTACTED_STATUSES = (STATUS_FOUND, STATUS_GENERATED, STATUS_FAILED)
+# Spreadsheet column -> tracker field. The order is internship_applications.xlsx's and is used for
+# new exports; new_grad_jobs.xlsx has no Application Date column and puts the deadline fourth, so
+# exporting over an existing spreadsheet keeps that file's own header order instead
+TRACKER_FIELDS = {
+    'Company': 'company', 'Position': 'position', 'Location': 'location', 'Application Date': 'application_date',
+    'Status': 'status', 'Link': 'link', 'Application Deadline': 'deadline',
+}
+TRACKER_COLUMNS = list(TRACKER_FIELDS)
+
+# Run journal: per-run checkpoints so an interrupted run resumes where it stopped
+# (override the location with JOURNAL_PATH in .env)
+JOURNAL_PATH = 'runs.db'
+RUN_SCRAPED = 'scraped'
+RUN_GENERATED = 'generated'
+RUN_DRAFTED = 'drafted'
+
+# Crawl mode: how many pagination links deep to follow from each VC URL (override
+# with CRAWL_MAX_DEPTH in .env), pages fetched at once overall and per host, and
+# the minimum gap between requests to the same host
+CRAWL_MAX_DEPTH = 2
+CRAWL_WORKERS = 8
+CRAWL_PER_HOST_CONCURRENCY = 2
+CRAWL_HOST_DELAY = 1.0
+# Links that lead to the next page of a paginated portfolio
+PAGINATION_TEXT = re.compile(r'^(next|next page|older|more|load more|show more|see more|view more|›|»|>|→)\W*$', re.I)
+# ...and page-numbered URLs, which only count on the current page's own path
+# (a '?p=55' elsewhere on the site is a blog permalink, not the next page)
+PAGINATION_HREF = re.compile(r'[?&](page|p|pg|offset|start)=(\d+)|/page/(\d+)/?$', re.I)
+
+# Client-side rate limits, so calls are paced to the account limits instead of
+# bursting into 429s. Requests and tokens per minute for each model (scale them
+# with OPENAI_LIMIT_SCALE in .env for other usage tiers); the x-ratelimit-*
+# response headers correct these as soon as the first response comes back.
+OPENAI_RATE_LIMITS = {
+    'gpt-4': {'rpm': 500, 'tpm': 10000},
+    'gpt-3.5-turbo': {'rpm': 3500, 'tpm': 200000},
+}
+DEFAULT_OPENAI_RATE_LIMIT = {'rpm': 500, 'tpm': 30000}
+RATE_LIMIT_MAX_RETRIES = 5
+# Gmail allows 250 quota units per user per second; drafts.create costs 10
+GMAIL_QUOTA_UNITS_PER_SECOND = 250
+GMAIL_DRAFT_QUOTA_UNITS = 10
+
+# Per-stage timing, size and token metrics, one JSON object per line
+# (override the location with METRICS_PATH in .env)
+METRICS_PATH = 'metrics.jsonl'
+METRIC_TOTALS = ('bytes', 'prompt_tokens', 'completion_tokens', 'retries', 'throttled_seconds')
+
+# How often the Tk main loop drains results posted by background jobs
+UI_POLL_INTERVAL_MS = 100
+
+# Results view: rows listed at once (refine the filter to see others), run log
+# lines kept, and how long typing in the search box settles before filtering
+RESULTS_MAX_ROWS = 2000
+RESULTS_LOG_LINES = 200
+RESULTS_SEARCH_DELAY_MS = 150
+STATUS_WRITING = 'Writing...'
+RESULT_FILTERS = {'All': None, 'Generated': STATUS_GENERATED, 'Drafted': STATUS_DRAFTED, 'Failed': STATUS_FAILED}
+
+class BackgroundJobExecutor:
+    """
+    Runs one long job at a time on a worker thread so the Tk window stays responsive.
+    Workers never touch widgets directly: they post callbacks to a thread-safe queue
+    that the main loop drains with after().
+    """
+    def __init__(self, window, poll_interval_ms: int = UI_POLL_INTERVAL_MS):
+        self.window = window
+        self.poll_interval_ms = poll_interval_ms
+        self.ui_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = None
+        self.window.after(self.poll_interval_ms, self.process_ui_queue)
+
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def is_cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def submit(self, target, *args, on_done=None) -> bool:
+        """
+        Start target(*args) on a background thread. on_done is posted to the UI thread
+        when the job finishes, even if it raised. Returns False if a job is already running.
+        """
+        if self.is_running():
+            return False
+
+        self.cancel_event.clear()
+
+        def worker():
+            try:
+                target(*args)
+            except Exception as e:
+                print(f"Background job failed: {str(e)}")
+            finally:
+                if on_done:
+                    self.post(on_done)
+
+        self.thread = threading.Thread(target=worker, daemon=True)
+        self.thread.start()
+        return True
+
+    def cancel(self):
+        """Ask the running job to stop at its next checkpoint"""
+        self.cancel_event.set()
+
+    def post(self, callback, *args):
+        """Schedule callback(*args) on the Tk main thread (safe to call from any thread)"""
+        self.ui_queue.put((callback, args))
+
+    def process_ui_queue(self):
+        try:
+            while True:
+                callback, args = self.ui_queue.get_nowait()
+                try:
+                    callback(*args)
+                except Exception as e:
+                    print(f"UI update failed: {str(e)}")
+        except queue.Empty:
+            pass
+        self.window.after(self.poll_interval_ms, self.process_ui_queue)
+
+class PortfolioPageParser(HTMLParser):
+    """
+    Streaming HTML parser that keeps only what matters for finding portfolio
+    companies: visible text and links. Scripts, styles and other non-visible
+    markup are dropped. Feed it the page in any number of pieces, then read lines
+    (text and 'text [url]' entries in page order) and links (href, rel and text pieces,
+    plus where the link sits: its layout signature, enclosing containers and whether
+    it is in the site's navigation or footer).
+    """
+    SKIPPED_TAGS = {'script', 'style', 'noscript', 'svg', 'head', 'template', 'iframe', 'canvas'}
+    BLOCK_TAGS = {'p', 'div', 'li', 'tr', 'section', 'article', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'br', 'ul', 'ol', 'table'}
+    # Elements that group links into cards and lists; each link remembers the ones around it
+    CONTAINER_TAGS = {'div', 'li', 'tr', 'td', 'section', 'article', 'ul', 'ol', 'table', 'main',
+                      'nav', 'footer', 'header', 'aside'}
+    # Site navigation, footers and sidebars: their links are never portfolio companies
+    CHROME_TAGS = {'nav', 'footer', 'aside'}
+    CHROME_ROLES = {'navigation', 'contentinfo', 'banner'}
+    CHROME_NAMES = {'footer', 'site-footer', 'page-footer', 'nav', 'navbar', 'navigation', 'site-nav',
+                    'menu', 'main-menu', 'site-header', 'breadcrumb', 'breadcrumbs'}
+    # How many enclosing containers make up a link's layout signature
+    LAYOUT_DEPTH = 3
+
+    def __init__(self, base_url: str = ''):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.lines = []
+        self.links = []
+        self.current = []
+        self.skip_depth = 0
+        self.link_href = None
+        self.link_rel = ''
+        self.link_text = []
+        self.link_context = {}
+        self.containers = []
+        self.container_count = 0
+
+    def open_container(self, tag: str, attributes: Dict):
+        classes = (attributes.get('class') or '').split()
+        names = set(classes) | {attributes.get('id') or ''}
+        in_article = any(container['tag'] == 'article' for container in self.containers)
+        chrome = ((tag in self.CHROME_TAGS and not in_article)
+                  or (attributes.get('role') or '') in self.CHROME_ROLES
+                  or bool(names & self.CHROME_NAMES))
+        # Numbered classes like card-1, card-2 belong to the same layout
+        signature = tag + ''.join('.' + re.sub(r'\d+', 'N', name) for name in sorted(classes))
+        self.container_count += 1
+        self.containers.append({'tag': tag, 'id': self.container_count, 'signature': signature,
+                                'chrome': chrome or bool(self.containers and self.containers[-1]['chrome'])})
+
+    def close_container(self, tag: str):
+        # Browsers forgive unclosed tags, so pop back to the matching element if there is one
+        for index in range(len(self.containers) - 1, -1, -1):
+            if self.containers[index]['tag'] == tag:
+                del self.containers[index:]
+                return
+
+    def current_link_context(self) -> Dict:
+        return {
+            'chrome': bool(self.containers and self.containers[-1]['chrome']),
+            'layout': '>'.join(container['signature'] for container in self.containers[-self.LAYOUT_DEPTH:]),
+            'ancestors': tuple(container['id'] for container in self.containers),
+        }
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self.skip_depth += 1
+            return
+        if self.skip_depth:
+            return
+        if tag in self.BLOCK_TAGS:
+            self.flush()
+        if tag in self.CONTAINER_TAGS:
+            self.open_container(tag, dict(attrs))
+        if tag == 'a':
+            attributes = dict(attrs)
+            href = attributes.get('href') or ''
+            if href and not href.startswith(('#', 'javascript:', 'mailto:', 'tel:')):
+                self.flush()
+                self.link_href = urljoin(self.base_url, href)
+                self.link_rel = (attributes.get('rel') or '').lower()
+                self.link_text = []
+                self.link_context = self.current_link_context()
+        elif tag == 'img' and self.link_href:
+            # Logo-only links carry the company name in the alt text
+            alt = dict(attrs).get('alt') or ''
+            if alt:
+                self.link_text.append(re.sub(r'\s+logo$', '', alt.strip(), flags=re.I))
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if self.skip_depth:
+            return
+        if tag == 'a' and self.link_href:
+            pieces = [' '.join(piece.split()) for piece in self.link_text]
+            pieces = [piece for piece in pieces if piece]
+            self.links.append({'href': self.link_href, 'texts': pieces, 'rel': self.link_rel, **self.link_context})
+            text = ' '.join(pieces)
+            self.add_line(f"{text} [{self.link_href}]" if text else f"[{self.link_href}]")
+            self.link_href = None
+            self.link_text = []
+        elif tag in self.BLOCK_TAGS:
+            self.flush()
+        if tag in self.CONTAINER_TAGS:
+            self.close_container(tag)
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        if self.link_href:
+            self.link_text.append(data)
+        else:
+            self.current.append(data)
+
+    def flush(self):
+        text = ' '.join(' '.join(self.current).split())
+        self.current = []
+        if text:
+            self.add_line(text)
+
+    def add_line(self, line: str):
+        # Navigation and card layouts repeat the same line back to back
+        if not self.lines or self.lines[-1] != line:
+            self.lines.append(line)
+
+    def close(self):
+        super().close()
+        self.flush()
+
+class HostThrottle:
+    """
+    Limits concurrent requests per host and spaces them at least delay seconds
+    apart, so crawling many portfolios at once stays polite to each site.
+    """
+    def __init__(self, max_per_host: int = CRAWL_PER_HOST_CONCURRENCY, delay: float = CRAWL_HOST_DELAY):
+        self.max_per_host = max_per_host
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.semaphores = {}
+        self.next_request_at = {}
+
+    @contextmanager
+    def slot(self, url: str):
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            semaphore = self.semaphores.setdefault(host, threading.Semaphore(self.max_per_host))
+        with semaphore:
+            with self.lock:
+                start_at = max(time.time(), self.next_request_at.get(host, 0))
+                self.next_request_at[host] = start_at + self.delay
+            wait = start_at - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            yield
+
+class TokenBucket:
+    """
+    Refills at rate units per second up to capacity. take() reserves units right
+    away and sleeps until they are covered, so concurrent callers queue up behind
+    each other instead of all firing at once. Requests bigger than capacity are
+    allowed; they just wait for the bucket to fill.
+    """
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.level = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def take(self, amount: float) -> float:
+        """Reserve amount units, sleep until they are available and return the time waited"""
+        with self.lock:
+            self.refill()
+            wait = max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+            self.level -= amount
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def sync(self, limit: float = None, remaining: float = None, reset_seconds: float = None):
+        """Adopt the server's view of the limit and of what is left in the current window"""
+        with self.lock:
+            self.refill()
+            if limit:
+                self.rate = limit / 60.0
+                self.capacity = limit
+            if remaining is not None:
+                self.level = min(self.level, remaining)
+            if reset_seconds and remaining is not None and remaining < self.capacity:
+                # Refill no faster than the server says this window resets
+                self.rate = min(self.rate, max(self.capacity - remaining, 1) / reset_seconds)
+
+    def pause(self, seconds: float):
+        """Empty the bucket so nothing is sent for about seconds (after a 429)"""
+        with self.lock:
+            self.refill()
+            self.level = min(self.level, -seconds * self.rate)
+
+def parse_reset_seconds(value: str):
+    """Parse OpenAI reset headers like '1s', '6m0s' or '20ms' into seconds"""
+    if not value:
+        return None
+    seconds = 0.0
+    for amount, unit in re.findall(r'([\d.]+)(ms|h|m|s)', value):
+        seconds += float(amount) * {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}[unit]
+    return seconds or None
+
+class RateLimiter:
+    """
+    One scheduler shared by every worker thread: a requests-per-minute and a
+    tokens-per-minute bucket per OpenAI model, and a quota bucket for Gmail.
+    """
+    def __init__(self, scale: float = 1.0):
+        self.scale = scale
+        self.lock = threading.Lock()
+        self.models = {}
+        self.gmail = TokenBucket(GMAIL_QUOTA_UNITS_PER_SECOND, GMAIL_QUOTA_UNITS_PER_SECOND)
+
+    def buckets(self, model: str):
+        with self.lock:
+            if model not in self.models:
+                limits = OPENAI_RATE_LIMITS.get(model, DEFAULT_OPENAI_RATE_LIMIT)
+                rpm, tpm = limits['rpm'] * self.scale, limits['tpm'] * self.scale
+                self.models[model] = (TokenBucket(rpm, rpm / 60.0), TokenBucket(tpm, tpm / 60.0))
+            return self.models[model]
+
+    @staticmethod
+    def estimate_tokens(messages: List[Dict], max_tokens: int) -> int:
+        """OpenAI counts the prompt plus max_tokens against the TPM limit when the request arrives"""
+        prompt_chars = sum(len(message['content']) for message in messages)
+        return prompt_chars // CHARS_PER_TOKEN + 4 * len(messages) + max_tokens
+
+    def acquire_openai(self, model: str, tokens: int) -> float:
+        requests_bucket, tokens_bucket = self.buckets(model)
+        return requests_bucket.take(1) + tokens_bucket.take(tokens)
+
+    def update_from_headers(self, model: str, headers):
+        """Adapt to x-ratelimit-* headers from an OpenAI response"""
+        if not headers:
+            return
+        requests_bucket, tokens_bucket = self.buckets(model)
+        for bucket, kind in ((requests_bucket, 'requests'), (tokens_bucket, 'tokens')):
+            limit = headers.get(f'x-ratelimit-limit-{kind}')
+            remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+            try:
+                bucket.sync(
+                    limit=float(limit) if limit else None,
+                    remaining=float(remaining) if remaining else None,
+                    reset_seconds=parse_reset_seconds(headers.get(f'x-ratelimit-reset-{kind}'))
+                )
+            except ValueError:
+                continue
+
+    def backoff_openai(self, model: str, headers, attempt: int) -> float:
+        """After a 429 (or a failed request), stop sending to model until the server says the limit resets"""
+        wait = None
+        if headers:
+            try:
+                if headers.get('retry-after-ms'):
+                    wait = float(headers['retry-after-ms']) / 1000
+                elif headers.get('retry-after'):
+                    wait = float(headers['retry-after'])
+            except ValueError:
+                pass
+            if wait is None:
+                resets = [parse_reset_seconds(headers.get(f'x-ratelimit-reset-{kind}')) for kind in ('requests', 'tokens')]
+                wait = max([reset for reset in resets if reset] or [0]) or None
+        if wait is None:
+            wait = 2 ** attempt
+        wait += random.uniform(0, 0.5)
+        for bucket in self.buckets(model):
+            bucket.pause(wait)
+        return wait
+
+    def acquire_gmail(self, units: int) -> float:
+        return self.gmail.take(units)
+
+def normalize_domain(website: str) -> str:
+    """Reduce a URL to a comparable domain, e.g. 'https://www.Stripe.com/about' -> 'stripe.com'"""
+    website = (website or '').strip().lower()
+    if not website:
+        return ''
+    if '://' not in website:
+        website = 'http://' + website
+    domain = urlparse(website).netloc.split(':')[0]
+    return domain[4:] if domain.startswith('www.') else domain
+
+def root_domain(domain: str) -> str:
+    """
+    Strip subdomains, e.g. 'jobs.stripe.com' -> 'stripe.com', 'shop.foo.co.uk' -> 'foo.co.uk'.
+    On shared hosting the company's own label is kept: 'app.foo.vercel.app' -> 'foo.vercel.app'.
+    """
+    labels = domain.split('.')
+    if len(labels) > 2 and '.'.join(labels[-2:]) in SHARED_HOSTING_SUFFIXES:
+        return '.'.join(labels[-3:])
+    if len(labels) > 2 and len(labels[-1]) == 2 and labels[-2] in ('co', 'com', 'org', 'net', 'ac', 'gov'):
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+@contextmanager
+def sqlite_connection(path: str):
+    """A connection that commits (or rolls back) and is closed when the block ends"""
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+class PipelineMetrics:
+    """
+    Records wall time, bytes, tokens, retries and errors for each pipeline stage
+    (page fetch, LLM calls, Gmail calls). Every measurement is appended to a JSON
+    lines file as it happens, and finish_run() adds a per-stage summary.
+    """
+    def __init__(self, path: str = METRICS_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.events = []
+        self.run_id = None
+
+    def start_run(self, name: str):
+        with self.lock:
+            self.events = []
+            self.run_id = f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+
+    @contextmanager
+    def stage(self, name: str, **fields):
+        """
+        Time a block as one measurement of a stage. The yielded dict can be filled
+        with bytes, prompt_tokens, completion_tokens, retries or any other detail.
+        An exception is recorded as the stage's error and re-raised.
+        """
+        record = {'stage': name, **fields}
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record['error'] = str(e)[:200] or type(e).__name__
+            raise
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 4)
+            self.add(record)
+
+    def add(self, record: Dict):
+        record['run'] = self.run_id
+        record['time'] = datetime.now().isoformat(timespec='seconds')
+        with self.lock:
+            self.events.append(record)
+            self.write(record)
+
+    def write(self, record: Dict):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+        except OSError as e:
+            print(f"Could not write metrics: {str(e)}")
+
+    def summary(self) -> Dict:
+        """Per-stage calls, errors, latency (total, mean, p50, p95, max) and totals"""
+        with self.lock:
+            events = list(self.events)
+        stages = {}
+        for event in events:
+            stages.setdefault(event['stage'], []).append(event)
+        summary = {}
+        for name, stage_events in stages.items():
+            seconds = sorted(event['seconds'] for event in stage_events)
+            stats = {
+                'calls': len(stage_events),
+                'errors': sum(1 for event in stage_events if event.get('error')),
+                'cache_hits': sum(1 for event in stage_events if event.get('cache') == 'hit'),
+                'total_seconds': round(sum(seconds), 3),
+                'mean_seconds': round(sum(seconds) / len(seconds), 3),
+                'p50_seconds': seconds[len(seconds) // 2],
+                'p95_seconds': seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))],
+                'max_seconds': seconds[-1],
+            }
+            for total in METRIC_TOTALS:
+                stats[total] = sum(event.get(total) or 0 for event in stage_events)
+            summary[name] = stats
+        return summary
+
+    def format_summary(self, summary: Dict) -> str:
+        if not summary:
+            return "No pipeline stages were run"
+        lines = [f"Run summary ({self.run_id}):"]
+        for name, stats in summary.items():
+            line = (
+                f"  {name}: {stats['calls']} calls, {stats['errors']} errors, "
+                f"{stats['total_seconds']:.2f}s total, p50 {stats['p50_seconds']:.2f}s, p95 {stats['p95_seconds']:.2f}s"
+            )
+            if stats['cache_hits']:
+                line += f", {stats['cache_hits']} cache hits"
+            if stats['bytes']:
+                line += f", {stats['bytes'] / 1024:.0f} KB"
+            if stats['prompt_tokens'] or stats['completion_tokens']:
+                line += f", {stats['prompt_tokens']} prompt + {stats['completion_tokens']} completion tokens"
+            if stats['retries']:
+                line += f", {stats['retries']} retries"
+            if stats['throttled_seconds']:
+                line += f", {stats['throttled_seconds']:.1f}s waiting on rate limits"
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def finish_run(self) -> str:
+        """Write the run's summary to the metrics file and return it as readable text"""
+        summary = self.summary()
+        with self.lock:
+            self.write({'run': self.run_id, 'summary': summary})
+        return self.format_summary(summary)
+
+class ScrapeCache:
+    """
+    SQLite-backed cache for portfolio pages (keyed by URL, revalidated with
+    ETag/Last-Modified), LLM extraction responses (keyed by a hash of the
+    model and full prompt, which includes the page content) and generated emails
+    (keyed by a hash of the profile, startup, model and prompt version). Entries unused for
+    longer than ttl_seconds are dropped, and the least recently used entries are
+    evicted once the cache grows past max_bytes.
+    """
+    KEYED_TABLES = ('extractions', 'emails')
+
+    def __init__(self, path: str = CACHE_PATH, ttl_seconds: int = CACHE_TTL_SECONDS,
+                 max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        with self.connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "url TEXT PRIMARY KEY, body TEXT, etag TEXT, last_modified TEXT, "
+                "fetched_at REAL, accessed_at REAL, size INTEGER)"
+            )
+            for table in self.KEYED_TABLES:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ("
+                    "key TEXT PRIMARY KEY, response TEXT, accessed_at REAL, size INTEGER)"
+                )
+        self.evict()
+
+    def connect(self):
+        return sqlite_connection(self.path)
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get_page(self, url: str):
+        """Return the cached page as a dict (body, etag, last_modified, fetched_at) or None"""
+        with self.lock, self.connect() as conn:
+            row = conn.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        return {'body': row[0], 'etag': row[1], 'last_modified': row[2], 'fetched_at': row[3]}
+
+    def put_page(self, url: str, body: str, etag: str = None, last_modified: str = None):
+        now = time.time()
+        with self.lock, self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, body, etag, last_modified, now, now, len(body.encode('utf-8')))
+            )
+        self.evict()
+
+    def mark_page_revalidated(self, url: str):
+        """The server answered 304 Not Modified, so the cached copy is fresh again"""
+        now = time.time()
+        with self.lock, self.connect() as conn:
+            conn.execute("UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+
+    def get_keyed(self, table: str, key: str):
+        with self.lock, self.connect() as conn:
+            row = conn.execute(f"SELECT response FROM {table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute(f"UPDATE {table} SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put_keyed(self, table: str, key: str, response: str):
+        with self.lock, self.connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?, ?)",
+                (key, response, time.time(), len(response.encode('utf-8')))
+            )
+        self.evict()
+
+    def get_extraction(self, key: str):
+        return self.get_keyed('extractions', key)
+
+    def put_extraction(self, key: str, response: str):
+        self.put_keyed('extractions', key, response)
+
+    def get_email(self, key: str):
+        return self.get_keyed('emails', key)
+
+    def put_email(self, key: str, body: str):
+        self.put_keyed('emails', key, body)
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones until under max_bytes"""
+        cutoff = time.time() - self.ttl_seconds
+        with self.lock, self.connect() as conn:
+            conn.execute("DELETE FROM pages WHERE accessed_at < ?", (cutoff,))
+            for table in self.KEYED_TABLES:
+                conn.execute(f"DELETE FROM {table} WHERE accessed_at < ?", (cutoff,))
+            total = conn.execute(
+                "SELECT (SELECT COALESCE(SUM(size), 0) FROM pages)"
+                + "".join(f" + (SELECT COALESCE(SUM(size), 0) FROM {table})" for table in self.KEYED_TABLES)
+            ).fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = conn.execute(
+                "SELECT 'pages', url, size, accessed_at FROM pages"
+                + "".join(f" UNION ALL SELECT '{table}', key, size, accessed_at FROM {table}" for table in self.KEYED_TABLES)
+                + " ORDER BY accessed_at"
+            ).fetchall()
+            for table, key, size, _ in rows:
+                if total <= self.max_bytes:
+                    break
+                column = 'url' if table == 'pages' else 'key'
+                conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (key,))
+                total -= size
+
+class ApplicationTracker:
+    """
+    Persistent record of every company the agent has seen, one row per company
+    domain, with its generated email, status and Gmail draft ID. Indexed on domain,
+    status and date so dedup checks stay fast with thousands of applications.
+    Imports from and exports to the Excel tracker layout.
+    """
+    def __init__(self, path: str = TRACKER_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        with self.connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS applications ("
+                "id INTEGER PRIMARY KEY, domain TEXT NOT NULL UNIQUE, company TEXT, position TEXT, "
+                "location TEXT, link TEXT, status TEXT, application_date TEXT, deadline TEXT, "
+                "to_email TEXT, subject TEXT, body TEXT, draft_id TEXT, error TEXT, updated_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_applications_status ON applications (status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_applications_date ON applications (application_date)")
+
+    def connect(self):
+        return sqlite_connection(self.path)
+
+    @staticmethod
+    def company_key(company: str, website: str = '') -> str:
+        """Companies are identified by root domain, or by name when there is no website"""
+        domain = normalize_domain(website)
+        if domain:
+            return root_domain(domain)
+        return 'name:' + (company or '').strip().lower()
+
+    def upsert(self, key: str, **fields):
+        """Insert the company or update the given fields on its existing row"""
+        fields['updated_at'] = time.time()
+        columns = ', '.join(fields)
+        placeholders = ', '.join('?' for _ in fields)
+        updates = ', '.join(f"{column} = excluded.{column}" for column in fields)
+        with self.lock, self.connect() as conn:
+            conn.execute(
+                f"INSERT INTO applications (domain, {columns}) VALUES (?, {placeholders}) "
+                f"ON CONFLICT(domain) DO UPDATE SET {updates}",
+                (key, *fields.values())
+            )
+
+    def record_startups(self, startups: List[Dict]):
+        """Add newly found companies without touching the status of ones already tracked"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        with self.lock, self.connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO applications (domain, company, position, location, link, status, "
+                "application_date, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (self.company_key(startup['name'], startup.get('website', '')), startup['name'],
+                     'New Grad', startup.get('location', ''), startup.get('website', ''), STATUS_FOUND,
+                     today, time.time())
+                    for startup in startups
+                ]
+            )
+
+    def record_email(self, email_data: Dict):
+        self.upsert(self.company_key(email_data['startup_name'], email_data.get('website', '')),
+                    company=email_data['startup_name'], to_email=email_data['to_email'],
+                    subject=email_data['subject'], body=email_data['body'], status=STATUS_GENERATED, error=None)
+
+    def record_draft(self, email_data: Dict, draft_id: str):
+        self.upsert(self.company_key(email_data['startup_name'], email_data.get('website', '')),
+                    company=email_data['startup_name'], status=STATUS_DRAFTED, draft_id=draft_id,
+                    application_date=datetime.now().strftime('%Y-%m-%d'), error=None)
+
+    def record_failure(self, company: str, website: str, error: Exception):
+        self.upsert(self.company_key(company, website), company=company, status=STATUS_FAILED, error=str(error))
+
+    def get_application(self, key: str):
+        """One company's row as a dict, including its email body, or None"""
+        with self.lock, self.connect() as conn:
+            row = conn.execute(
+                "SELECT company, status, to_email, subject, body, draft_id, error, link "
+                "FROM applications WHERE domain = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('company', 'status', 'to_email', 'subject', 'body', 'draft_id', 'error', 'link'), row))
+
+    def list_results(self) -> List[tuple]:
+        """(key, company, status, to_email) for every company past 'Not Applied', oldest first, without bodies"""
+        with self.lock, self.connect() as conn:
+            return conn.execute(
+                "SELECT domain, company, status, to_email FROM applications WHERE status != ? ORDER BY updated_at",
+                (STATUS_FOUND,)
+            ).fetchall()
+
+    def contacted_keys(self) -> set:
+        """Company keys that have already been contacted, for O(1) checks during a run"""
+        placeholders = ', '.join('?' for _ in NOT_CONTACTED_STATUSES)
+        with self.lock, self.connect() as conn:
+            rows = conn.execute(
+                f"SELECT domain FROM applications WHERE status NOT IN ({placeholders})", NOT_CONTACTED_STATUSES
+            )
+            return {row[0] for row in rows}
+
+    @staticmethod
+    def spreadsheet_columns(path: str) -> List[str]:
+        """The tracker columns in an existing spreadsheet, in its header order (TRACKER_COLUMNS if there isn't one)"""
+        if not os.path.exists(path):
+            return TRACKER_COLUMNS
+        from openpyxl import load_workbook  # only needed for Excel import/export
+
+        workbook = load_workbook(path, read_only=True)
+        try:
+            header = next(workbook.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+        finally:
+            workbook.close()
+        columns = [str(cell).strip() for cell in header if cell is not None and str(cell).strip() in TRACKER_FIELDS]
+        return columns if 'Company' in columns else TRACKER_COLUMNS
+
+    def export_xlsx(self, path: str) -> int:
+        """
+        Write all applications to an Excel file, streaming rows. Overwriting an existing
+        tracker keeps its column layout. Returns the row count.
+        """
+        from openpyxl import Workbook  # only needed for Excel import/export
+
+        columns = self.spreadsheet_columns(path)
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Sheet1')
+        sheet.append(columns)
+        count = 0
+        with self.lock, self.connect() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(TRACKER_FIELDS[column] for column in columns)} "
+                "FROM applications ORDER BY application_date, company"
+            )
+            for row in rows:
+                sheet.append(list(row))
+                count += 1
+        workbook.save(path)
+        return count
+
+    def import_xlsx(self, path: str) -> int:
+        """
+        Merge rows from an Excel tracker (streamed, read-only) in one transaction.
+        New companies are added; for ones already tracked, non-empty spreadsheet
+        details are filled in, but the status only changes while the company hasn't
+        been contacted yet, so an old spreadsheet never downgrades a 'Draft Created'
+        or 'Applied' company back to one that gets emailed again.
+        Returns the number of rows imported.
+        """
+        from openpyxl import load_workbook  # only needed for Excel import/export
+
+        workbook = load_workbook(path, read_only=True)
+        count = 0
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = [str(cell).strip() if cell is not None else '' for cell in next(rows, [])]
+            columns = {name: header.index(name) for name in TRACKER_COLUMNS if name in header}
+            if 'Company' not in columns:
+                raise ValueError(f"{path} has no 'Company' column")
+
+            def cell(row, name):
+                index = columns.get(name)
+                value = row[index] if index is not None and index < len(row) else None
+                if isinstance(value, datetime):
+                    return value.strftime('%Y-%m-%d')
+                return '' if value is None else str(value).strip()
+
+            def records():
+                nonlocal count
+                now = time.time()
+                for row in rows:
+                    company = cell(row, 'Company')
+                    if not company:
+                        continue
+                    count += 1
+                    yield (self.company_key(company, cell(row, 'Link')), company, cell(row, 'Position'),
+                           cell(row, 'Location'), cell(row, 'Application Date'), cell(row, 'Status') or STATUS_FOUND,
+                           cell(row, 'Link'), cell(row, 'Application Deadline'), now)
+
+            not_contacted = ', '.join('?' for _ in NOT_CONTACTED_STATUSES)
+            filled = ', '.join(f"{column} = COALESCE(NULLIF(excluded.{column}, ''), applications.{column})"
+                               for column in ('position', 'location', 'application_date', 'link', 'deadline'))
+            with self.lock, self.connect() as conn:
+                conn.executemany(
+                    "INSERT INTO applications (domain, company, position, location, application_date, status, "
+                    "link, deadline, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    f"ON CONFLICT(domain) DO UPDATE SET {filled}, "
+                    f"status = CASE WHEN applications.status IN ({not_contacted}) AND excluded.status != ? "
+                    "THEN excluded.status ELSE applications.status END, "
+                    "updated_at = excluded.updated_at",
+                    (record + NOT_CONTACTED_STATUSES + (STATUS_FOUND,) for record in records())
+                )
+        finally:
+            workbook.close()
+        return count
+
+class RunJournal:
+    """
+    Checkpoints of each search-and-generate run: the startups it scraped, the email
+    generated for each and the Gmail draft created from it. A run stays open until
+    it completes, so restarting with the same URLs, depth and profile picks it up
+    from the last checkpoint instead of re-scraping, re-generating or re-drafting.
+    """
+    def __init__(self, path: str = JOURNAL_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        with self.connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "id INTEGER PRIMARY KEY, run_key TEXT NOT NULL, params TEXT, stage TEXT, "
+                "started_at REAL, finished_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_key ON runs (run_key, finished_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS run_startups ("
+                "run_id INTEGER NOT NULL, startup_key TEXT NOT NULL, position INTEGER, startup TEXT, "
+                "stage TEXT, email TEXT, draft_id TEXT, updated_at REAL, PRIMARY KEY (run_id, startup_key))"
+            )
+
+    def connect(self):
+        return sqlite_connection(self.path)
+
+    @staticmethod
+    def startup_key(name: str, website: str = '') -> str:
+        return ApplicationTracker.company_key(name, website)
+
+    def find_unfinished(self, run_key: str):
+        """The id of the latest open run with this key, or None"""
+        with self.lock, self.connect() as conn:
+            row = conn.execute(
+                "SELECT id FROM runs WHERE run_key = ? AND finished_at IS NULL ORDER BY id DESC LIMIT 1", (run_key,)
+            ).fetchone()
+            return row[0] if row else None
+
+    def start(self, run_key: str, params: Dict) -> int:
+        with self.lock, self.connect() as conn:
+            # Only one open run per key; an older one is superseded by starting over
+            conn.execute("UPDATE runs SET finished_at = ? WHERE run_key = ? AND finished_at IS NULL",
+                         (time.time(), run_key))
+            cursor = conn.execute("INSERT INTO runs (run_key, params, stage, started_at) VALUES (?, ?, ?, ?)",
+                                  (run_key, json.dumps(params), None, time.time()))
+            return cursor.lastrowid
+
+    def finish(self, run_id: int):
+        with self.lock, self.connect() as conn:
+            conn.execute("UPDATE runs SET finished_at = ? WHERE id = ?", (time.time(), run_id))
+
+    def record_scraped(self, run_id: int, startups: List[Dict]):
+        now = time.time()
+        with self.lock, self.connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO run_startups (run_id, startup_key, position, startup, stage, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (run_id, self.startup_key(startup['name'], startup.get('website', '')), position,
+                     json.dumps(startup), RUN_SCRAPED, now)
+                    for position, startup in enumerate(startups)
+                ]
+            )
+            conn.execute("UPDATE runs SET stage = ? WHERE id = ?", (RUN_SCRAPED, run_id))
+
+    def scraped_startups(self, run_id: int):
+        """The startups scraped by the run in their original order, or None if it never got that far"""
+        with self.lock, self.connect() as conn:
+            stage = conn.execute("SELECT stage FROM runs WHERE id = ?", (run_id,)).fetchone()
+            if not stage or stage[0] is None:
+                return None
+            rows = conn.execute("SELECT startup FROM run_startups WHERE run_id = ? ORDER BY position", (run_id,))
+            return [json.loads(row[0]) for row in rows]
+
+    def record_email(self, run_id: int, email_data: Dict):
+        with self.lock, self.connect() as conn:
+            conn.execute(
+                "UPDATE run_startups SET stage = ?, email = ?, updated_at = ? WHERE run_id = ? AND startup_key = ?",
+                (RUN_GENERATED, json.dumps(email_data), time.time(), run_id,
+                 self.startup_key(email_data['startup_name'], email_data.get('website', '')))
+            )
+
+    def record_draft(self, run_id: int, email_data: Dict, draft_id: str):
+        with self.lock, self.connect() as conn:
+            conn.execute(
+                "UPDATE run_startups SET stage = ?, draft_id = ?, updated_at = ? WHERE run_id = ? AND startup_key = ?",
+                (RUN_DRAFTED, draft_id, time.time(), run_id,
+                 self.startup_key(email_data['startup_name'], email_data.get('website', '')))
+            )
+
+    def generated_emails(self, run_id: int) -> Dict[str, Dict]:
+        """Emails the run already generated, by startup key, with 'draft_id' set once drafted"""
+        with self.lock, self.connect() as conn:
+            rows = conn.execute(
+                "SELECT startup_key, email, draft_id FROM run_startups WHERE run_id = ? AND email IS NOT NULL",
+                (run_id,)
+            )
+            emails = {}
+            for startup_key, email, draft_id in rows:
+                emails[startup_key] = json.loads(email)
+                if draft_id:
+                    emails[startup_key]['draft_id'] = draft_id
+            return emails
+
+class JobPipeline:
+    """
+    The scrape -> generate -> draft pipeline, with no UI. NewGradJobAgent adds the
+    Tk window on top of it; the headless command line (--headless) uses it directly.
+    """
     def __init__(self):
+        # openai reads OPENAI_API_KEY from the environment that load_dotenv fills in
         load_dotenv()
-        openai.api_key = os.getenv('OPENAI_API_KEY')
+        self.email_workers = max(1, int(os.getenv('EMAIL_WORKERS', DEFAULT_EMAIL_WORKERS)))
+        email_mode = os.getenv('EMAIL_MODE', 'full')
+        self.email_mode = email_mode if email_mode in EMAIL_MODES else 'full'
+        self.core_pitches = {}  # profile -> core pitch, for 'pitch' mode
+        self.core_pitch_lock = threading.Lock()
         self.gmail_service = None
-        self.setup_gui()
+        self.gmail_credentials = None
+        self.gmail_lock = threading.Lock()
+        self.token_refresh_timer = None
+        self.cache = ScrapeCache(os.getenv('CACHE_PATH', CACHE_PATH))
+        self.tracker = ApplicationTracker(os.getenv('TRACKER_PATH', TRACKER_PATH))
+        self.journal = RunJournal(os.getenv('JOURNAL_PATH', JOURNAL_PATH))
+        self.run_id = None  # the journaled run in progress
+        self.crawl_max_depth = max(0, int(os.getenv('CRAWL_MAX_DEPTH', CRAWL_MAX_DEPTH)))
+        self._http_session = None
+        self.http_session_lock = threading.Lock()
+        self.host_throttle = HostThrottle()
+        self.rate_limiter = RateLimiter(float(os.getenv('OPENAI_LIMIT_SCALE', 1.0)))
+        self.metrics = PipelineMetrics(os.getenv('METRICS_PATH', METRICS_PATH))
         self.user_info = {
             'name': '',
             'degree': '',
@@ -34,50 +1157,1408 @@ class NewGradJobAgent:
         }
         self.generated_emails = []  # Store generated emails for draft creation
 
-    def authenticate_gmail(self):
-        """Authenticate with Gmail API"""
-        creds = None
-        # Token file stores user's access and refresh tokens
-        if os.path.exists('token.pickle'):
-            with open('token.pickle', 'rb') as token:
-                creds = pickle.load(token)
-        
-        # If no valid credentials, let user log in
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    'credentials.json', SCOPES)
-                creds = flow.run_local_server(port=0)
-            
-            # Save credentials for next run
-            with open('token.pickle', 'wb') as token:
-                pickle.dump(creds, token)
-        
-        self.gmail_service = build('gmail', 'v1', credentials=creds)
-        return True
+    @property
+    def http_session(self):
+        """Pooled HTTP session for page fetches, created (and requests imported) on first use"""
+        with self.http_session_lock:
+            if self._http_session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=CRAWL_WORKERS, pool_maxsize=CRAWL_WORKERS)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._http_session = session
+            return self._http_session
+
+    @http_session.setter
+    def http_session(self, session):
+        self._http_session = session
+
+    def authenticate_gmail(self, interactive: bool = True):
+        """
+        Authenticate with Gmail API. Without interactive (headless runs), an existing
+        token.pickle is required because the browser sign-in can't be shown.
+        Once authenticated, the credentials and service are reused for the rest of the run.
+        """
+        with self.gmail_lock:
+            # Token file stores user's access and refresh tokens
+            creds = self.gmail_credentials or self.load_saved_credentials()
+
+            # If no valid credentials, let user log in
+            if not creds or not creds.valid:
+                if creds and creds.expired and creds.refresh_token:
+                    self.refresh_credentials(creds)
+                elif not interactive:
+                    raise RuntimeError("No saved Gmail credentials. Run the app once with a display "
+                                       "and click 'Authenticate Gmail' to create token.pickle.")
+                else:
+                    from google_auth_oauthlib.flow import InstalledAppFlow
+                    flow = InstalledAppFlow.from_client_secrets_file(
+                        'credentials.json', SCOPES)
+                    creds = flow.run_local_server(port=0)
+                    self.save_credentials(creds)
+
+            if self.gmail_service is None or creds is not self.gmail_credentials:
+                from googleapiclient.discovery import build
+                # The Gmail discovery document ships with google-api-python-client, so
+                # building the service reads it from disk rather than fetching it
+                self.gmail_service = build('gmail', 'v1', credentials=creds, static_discovery=True)
+                self.gmail_credentials = creds
+        self.schedule_token_refresh(creds)
+        return True
+
+    def load_saved_credentials(self):
+        if not os.path.exists(TOKEN_PATH):
+            return None
+        with open(TOKEN_PATH, 'rb') as token:
+            return pickle.load(token)
+
+    def save_credentials(self, creds):
+        with open(TOKEN_PATH, 'wb') as token:
+            pickle.dump(creds, token)
+
+    def refresh_credentials(self, creds):
+        from google.auth.transport.requests import Request
+        creds.refresh(Request())
+        # Save credentials for next run
+        self.save_credentials(creds)
+
+    def schedule_token_refresh(self, creds, delay: float = None):
+        """Refresh the access token in the background shortly before it expires"""
+        if self.token_refresh_timer is not None:
+            self.token_refresh_timer.cancel()
+        if not creds.refresh_token or not creds.expiry:
+            return
+        if delay is None:
+            # google-auth keeps expiry as naive UTC
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            delay = (creds.expiry - now).total_seconds() - TOKEN_REFRESH_MARGIN_SECONDS
+        self.token_refresh_timer = threading.Timer(max(delay, 0), self.refresh_token_in_background)
+        self.token_refresh_timer.daemon = True
+        self.token_refresh_timer.start()
+
+    def refresh_token_in_background(self):
+        creds = self.gmail_credentials
+        try:
+            with self.gmail_lock:
+                self.refresh_credentials(creds)
+        except Exception as e:
+            print(f"Background Gmail token refresh failed: {str(e)}")
+            self.schedule_token_refresh(creds, delay=TOKEN_REFRESH_RETRY_SECONDS)
+            return
+        self.schedule_token_refresh(creds)
+
+    def warm_up(self) -> bool:
+        """
+        Import openai and get Gmail ready from a saved token.pickle ahead of time,
+        so the first generation or draft creation doesn't wait on either.
+        Returns True if Gmail is authenticated.
+        """
+        load_openai()
+        try:
+            return self.authenticate_gmail(interactive=False)
+        except Exception as e:
+            print(f"Gmail not authenticated yet: {str(e)}")
+            return False
+
+    def build_draft_body(self, to_email: str, subject: str, body: str) -> Dict:
+        """Build the Gmail API request body for a draft"""
+        message = MIMEText(body)
+        message['to'] = to_email
+        message['subject'] = subject
+        raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
+        
+        return {
+            'message': {
+                'raw': raw_message
+            }
+        }
+
+    @staticmethod
+    def is_retryable_gmail_error(error: Exception) -> bool:
+        """Quota (429, 403 rate limit) and server errors are worth retrying; anything else is permanent"""
+        from googleapiclient.errors import HttpError
+        if isinstance(error, HttpError):
+            status = error.resp.status
+            if status in RETRYABLE_HTTP_STATUSES:
+                return True
+            if status == 403:
+                content = error.content.decode('utf-8', errors='ignore').lower()
+                return 'ratelimitexceeded' in content
+            return False
+        # Connection resets and timeouts while sending the batch
+        return isinstance(error, OSError)
+
+    def create_gmail_drafts_batch(self, emails: List[Dict], on_result=None, cancel_event: threading.Event = None,
+                                  batch_size: int = DRAFT_BATCH_SIZE, max_retries: int = DRAFT_MAX_RETRIES) -> Dict:
+        """
+        Create Gmail drafts for many emails using batch HTTP requests.
+        Drafts that fail with quota or server errors are retried with exponential
+        backoff and jitter. on_result(email_data, draft, error) is called once per email
+        when its outcome is final. Emails that already have a 'draft_id' are skipped,
+        and the ID of each new draft is stored on its email. Returns a summary with
+        'succeeded', 'skipped', 'retried' and 'failed' lists of startup names.
+        """
+        outcomes = {}
+        retried = set()
+        # Emails drafted earlier (in this session or before a crash) are not drafted twice
+        skipped = [index for index, email_data in enumerate(emails) if email_data.get('draft_id')]
+        pending = [index for index, email_data in enumerate(emails) if not email_data.get('draft_id')]
+
+        for attempt in range(max_retries + 1):
+            retry_next = []
+
+            for start in range(0, len(pending), batch_size):
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                chunk = pending[start:start + batch_size]
+                responses = {}
+
+                def callback(request_id, response, exception):
+                    responses[int(request_id)] = (response, exception)
+
+                batch = self.gmail_service.new_batch_http_request(callback=callback)
+                batch_bytes = 0
+                for index in chunk:
+                    email_data = emails[index]
+                    draft = self.build_draft_body(email_data['to_email'], email_data['subject'], email_data['body'])
+                    batch_bytes += len(draft['message']['raw'])
+                    batch.add(self.gmail_service.users().drafts().create(userId='me', body=draft),
+                              request_id=str(index))
+                with self.metrics.stage('gmail_batch', drafts=len(chunk), attempt=attempt + 1,
+                                        bytes=batch_bytes, retries=len(chunk) if attempt else 0) as record:
+                    record['throttled_seconds'] = self.rate_limiter.acquire_gmail(GMAIL_DRAFT_QUOTA_UNITS * len(chunk))
+                    try:
+                        batch.execute()
+                    except Exception as e:
+                        # The whole batch failed to send, so every request in it gets the same error
+                        record['error'] = str(e)[:200]
+                        for index in chunk:
+                            responses.setdefault(index, (None, e))
+                    record['failed'] = sum(1 for index in chunk if responses.get(index, (None, True))[1] is not None)
+
+                for index in chunk:
+                    response, error = responses.get(index, (None, Exception("No response in batch")))
+                    if error is None:
+                        outcomes[index] = (response, None)
+                    elif self.is_retryable_gmail_error(error) and attempt < max_retries:
+                        retry_next.append(index)
+                        retried.add(index)
+                        continue
+                    else:
+                        outcomes[index] = (None, error)
+                    draft, error = outcomes[index]
+                    if error is None:
+                        emails[index]['draft_id'] = draft.get('id', '')
+                        self.tracker.record_draft(emails[index], emails[index]['draft_id'])
+                        if self.run_id is not None:
+                            self.journal.record_draft(self.run_id, emails[index], emails[index]['draft_id'])
+                    else:
+                        self.tracker.record_failure(emails[index]['startup_name'], emails[index].get('website', ''), error)
+                    if on_result:
+                        on_result(emails[index], draft, error)
+
+            if not retry_next or (cancel_event is not None and cancel_event.is_set()):
+                break
+
+            delay = DRAFT_RETRY_BASE_DELAY * (2 ** attempt) + random.uniform(0, DRAFT_RETRY_BASE_DELAY)
+            print(f"Retrying {len(retry_next)} drafts in {delay:.1f}s (attempt {attempt + 2}/{max_retries + 1})")
+            time.sleep(delay)
+            pending = retry_next
+
+        summary = {'succeeded': [], 'skipped': [emails[index]['startup_name'] for index in skipped],
+                   'retried': [], 'failed': []}
+        for index, email_data in enumerate(emails):
+            name = email_data['startup_name']
+            if index in retried:
+                summary['retried'].append(name)
+            if index not in outcomes:
+                continue
+            draft, error = outcomes[index]
+            if error is None:
+                summary['succeeded'].append(name)
+            else:
+                summary['failed'].append(f"{name}: {str(error)}")
+        return summary
+
+    def fetch_page(self, url: str) -> str:
+        """
+        Fetch a page's HTML, serving it from the local cache while fresh and
+        revalidating with ETag/Last-Modified once it goes stale.
+        """
+        with self.metrics.stage('fetch', url=url) as record:
+            html_content = self.fetch_page_with_cache(url, record)
+            record['bytes'] = len(html_content.encode('utf-8'))
+            return html_content
+
+    def fetch_page_with_cache(self, url: str, record: Dict) -> str:
+        cached = self.cache.get_page(url)
+        if cached and time.time() - cached['fetched_at'] < PAGE_FRESH_SECONDS:
+            record['cache'] = 'hit'
+            return cached['body']
+
+        # Add headers to avoid being blocked
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        }
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        with self.host_throttle.slot(url):
+            response = self.http_session.get(url, headers=headers, timeout=15)
+        record['status'] = response.status_code
+        if cached and response.status_code == 304:
+            record['cache'] = 'revalidated'
+            self.cache.mark_page_revalidated(url)
+            return cached['body']
+        response.raise_for_status()
+        record['cache'] = 'miss'
+
+        self.cache.put_page(url, response.text, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return response.text
+
+    def cached_completion(self, model: str, messages: List[Dict], temperature: float, max_tokens: int):
+        """
+        Run a chat completion, reusing the stored response when the exact same
+        model and prompt were sent before. Used for extraction, where the prompt
+        embeds the page content, so a changed page always misses the cache.
+        Returns (content, truncated); truncated responses hit max_tokens and are not cached.
+        """
+        key = ScrapeCache.make_key(model, messages, temperature, max_tokens)
+        with self.metrics.stage('extract_llm', model=model) as record:
+            cached = self.cache.get_extraction(key)
+            if cached is not None:
+                record['cache'] = 'hit'
+                return cached, False
+
+            response = self.rate_limited_completion(
+                record,
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+            self.record_usage(record, response.usage)
+            content = response.choices[0].message.content
+            if getattr(response.choices[0], 'finish_reason', None) == 'length':
+                record['truncated'] = True
+                return content, True
+            self.cache.put_extraction(key, content)
+            return content, False
+
+    def rate_limited_completion(self, record: Dict, client=None, **request):
+        """
+        Send a chat completion through the shared rate limiter: wait for the model's
+        request and token budget, adapt to the x-ratelimit-* headers of the response,
+        and after a 429 wait until the limit resets and try again. Dropped connections
+        and server errors are retried the same way, since the SDK doesn't retry itself.
+        client defaults to the openai module.
+        """
+        client = client or load_openai()
+        model = request['model']
+        tokens = RateLimiter.estimate_tokens(request['messages'], request.get('max_tokens') or 0)
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            waited = self.rate_limiter.acquire_openai(model, tokens)
+            if waited:
+                record['throttled_seconds'] = round(record.get('throttled_seconds', 0) + waited, 3)
+            try:
+                raw_response = client.chat.completions.with_raw_response.create(**request)
+            except client.RateLimitError as e:
+                # An exhausted quota (billing) won't clear by waiting
+                if attempt == RATE_LIMIT_MAX_RETRIES or getattr(e, 'code', None) == 'insufficient_quota':
+                    raise
+                wait = self.rate_limiter.backoff_openai(model, e.response.headers, attempt)
+                record['retries'] = record.get('retries', 0) + 1
+                print(f"Rate limited on {model}, retrying in {wait:.1f}s")
+                continue
+            except (client.APIConnectionError, client.InternalServerError) as e:
+                if attempt == RATE_LIMIT_MAX_RETRIES:
+                    raise
+                response = getattr(e, 'response', None)
+                wait = self.rate_limiter.backoff_openai(model, response.headers if response is not None else None, attempt)
+                record['retries'] = record.get('retries', 0) + 1
+                print(f"{model} request failed ({type(e).__name__}), retrying in {wait:.1f}s")
+                continue
+            self.rate_limiter.update_from_headers(model, raw_response.headers)
+            return raw_response.parse()
+
+    @staticmethod
+    def record_usage(record: Dict, usage):
+        if usage is not None:
+            record['prompt_tokens'] = usage.prompt_tokens
+            record['completion_tokens'] = usage.completion_tokens
+
+    def parse_portfolio_page(self, html_content: str, base_url: str) -> PortfolioPageParser:
+        """Stream the page through PortfolioPageParser to get its visible text and links"""
+        parser = PortfolioPageParser(base_url)
+        piece_size = 64 * 1024
+        for start in range(0, len(html_content), piece_size):
+            parser.feed(html_content[start:start + piece_size])
+        parser.close()
+        return parser
+
+    def chunk_page_lines(self, lines: List[str], chunk_tokens: int = EXTRACTION_CHUNK_TOKENS,
+                         max_lines: int = EXTRACTION_CHUNK_LINES) -> List[str]:
+        """
+        Split the page's visible lines into chunks that fit the extraction input budget
+        and hold few enough lines that the companies in them fit in the response
+        """
+        max_chars = chunk_tokens * CHARS_PER_TOKEN
+        chunks = []
+        current = []
+        current_size = 0
+        for line in lines:
+            line = line[:max_chars]
+            if current and (current_size + len(line) + 1 > max_chars or len(current) >= max_lines):
+                chunks.append('\n'.join(current))
+                current = []
+                current_size = 0
+            current.append(line)
+            current_size += len(line) + 1
+        if current:
+            chunks.append('\n'.join(current))
+        return chunks
+
+    def get_site_rule(self, vc_website: str) -> Dict:
+        vc_domain = normalize_domain(vc_website)
+        for domain, rule in SITE_RULES.items():
+            if vc_domain == domain or vc_domain.endswith('.' + domain):
+                return rule
+        return {}
+
+    def company_links(self, page: PortfolioPageParser, vc_website: str, ignore_domains=()) -> List[Dict]:
+        """
+        Outbound links that could be portfolio companies: one per distinct, non-social
+        domain, outside the site's navigation and footer. Each is {'link', 'domain'}.
+        """
+        vc_root = root_domain(normalize_domain(vc_website))
+        candidates = []
+        seen = set()
+        for link in page.links:
+            if link.get('chrome') or not link['href'].startswith(('http://', 'https://')):
+                continue
+            full_domain = normalize_domain(link['href'])
+            if not full_domain or full_domain in NON_COMPANY_DOMAINS or full_domain in ignore_domains:
+                continue
+            domain = root_domain(full_domain)
+            if domain in seen or domain == vc_root:
+                continue
+            if domain in NON_COMPANY_DOMAINS or domain in ignore_domains:
+                continue
+            seen.add(domain)
+            candidates.append({'link': link, 'domain': domain})
+        return candidates
+
+    @staticmethod
+    def link_startup(link: Dict, domain: str) -> Dict:
+        """Name the company after the link's first meaningful text (or logo alt text), falling back to the domain"""
+        name = next((text for text in link['texts'] if not GENERIC_LINK_TEXT.match(text)), '')
+        if not name or len(name) > 60:
+            name = domain.split('.')[0].capitalize()
+        return {
+            'name': name,
+            'website': f"https://{domain}",
+            'contact_name': 'Hiring Manager',
+            'contact_email': f"careers@{domain}",
+            'contact_linkedin': ''
+        }
+
+    @staticmethod
+    def layout_cards(links: List[Dict]) -> Dict[str, set]:
+        """
+        Group links by layout signature, counting the distinct cards (innermost
+        containers) each layout's links sit in. Card grids and lists put every link
+        in its own sibling container; prose links share one paragraph container.
+        """
+        cards = {}
+        for link in links:
+            cards.setdefault(link['layout'], set()).add(link['ancestors'][-1] if link['ancestors'] else None)
+        return cards
+
+    def extract_startups_from_links(self, page: PortfolioPageParser, vc_website: str,
+                                    ignore_domains=()) -> List[Dict]:
+        """
+        Treat every outbound company link that sits in a repeated card/list layout -
+        one of several sibling containers with the same structure - as a portfolio
+        company. Links in running text (press mentions, policy pages) share their
+        containers and are left out.
+        """
+        candidates = self.company_links(page, vc_website, ignore_domains)
+        cards = self.layout_cards([candidate['link'] for candidate in candidates])
+        return [self.link_startup(candidate['link'], candidate['domain'])
+                for candidate in candidates if len(cards[candidate['link']['layout']]) > 1]
+
+    def links_look_like_portfolio(self, page: PortfolioPageParser, vc_website: str,
+                                  ignore_domains=(), min_companies: int = LOCAL_MIN_COMPANIES) -> bool:
+        """
+        Decide from the page structure whether its outbound links are the portfolio.
+        That needs one repeated layout (the company cards) spread over at least
+        min_companies sibling containers and holding most of the outbound company
+        links, and no larger repeated block of links back into the VC's own site -
+        then the cards point at internal company pages and the outbound links are
+        something else.
+        """
+        candidates = self.company_links(page, vc_website, ignore_domains)
+        if len(candidates) < min_companies:
+            return False
+        outbound_cards = self.layout_cards([candidate['link'] for candidate in candidates])
+        layout, cards = max(outbound_cards.items(), key=lambda item: len(item[1]))
+        in_layout = sum(1 for candidate in candidates if candidate['link']['layout'] == layout)
+
+        vc_root = root_domain(normalize_domain(vc_website))
+        internal_cards = self.layout_cards([link for link in page.links if not link.get('chrome')
+                                            and root_domain(normalize_domain(link['href'])) == vc_root])
+        largest_internal = max((len(cards) for cards in internal_cards.values()), default=0)
+
+        return (len(cards) >= min_companies
+                and in_layout >= LOCAL_MIN_LAYOUT_SHARE * len(candidates)
+                and len(cards) >= largest_internal)
+
+    def extract_startups_from_company_pages(self, page: PortfolioPageParser, vc_website: str,
+                                            path_pattern) -> List[Dict]:
+        """
+        Read a directory whose cards link to each company's page on the VC's own site.
+        The company name comes from the link text (or the page's slug), and its website
+        from an outbound link inside the same card, when the card has one.
+        """
+        vc_root = root_domain(normalize_domain(vc_website))
+        companies = {}
+        for link in page.links:
+            if link.get('chrome') or root_domain(normalize_domain(link['href'])) != vc_root:
+                continue
+            match = path_pattern.match(urlparse(link['href']).path)
+            if not match:
+                continue
+            slug = match.group('slug').lower()
+            company = companies.setdefault(slug, {'links': [], 'name': ''})
+            company['links'].append(link)
+            if not company['name']:
+                company['name'] = next((text for text in link['texts']
+                                        if not GENERIC_LINK_TEXT.match(text) and len(text) <= 60), '')
+        if not companies:
+            return []
+
+        # A company's card is the outermost container that holds no other company
+        slugs_in_container = {}
+        for slug, company in companies.items():
+            for link in company['links']:
+                for container in link['ancestors']:
+                    slugs_in_container.setdefault(container, set()).add(slug)
+        rule = self.get_site_rule(vc_website)
+        website_in_container = {}
+        for candidate in self.company_links(page, vc_website, rule.get('ignore_domains', ())):
+            for container in candidate['link']['ancestors']:
+                website_in_container.setdefault(container, candidate['domain'])
+
+        startups = []
+        for slug, company in companies.items():
+            domain = ''
+            for link in company['links']:
+                card = next((container for container in link['ancestors']
+                             if slugs_in_container[container] == {slug}), None)
+                if card is not None and card in website_in_container:
+                    domain = website_in_container[card]
+                    break
+            startups.append(self.add_contact_fields({
+                'name': company['name'] or slug.replace('-', ' ').replace('_', ' ').title(),
+                'website': f"https://{domain}" if domain else '',
+            }))
+        return startups
+
+    def extract_startups_locally(self, page: PortfolioPageParser, vc_website: str):
+        """
+        Try to read the portfolio straight from the page's links, without the LLM.
+        Returns (startups, confident); when not confident the caller should use the LLM.
+        """
+        rule = self.get_site_rule(vc_website)
+        min_companies = rule.get('min_companies', LOCAL_MIN_COMPANIES)
+        ignore_domains = rule.get('ignore_domains', ())
+        if 'extract' in rule:
+            startups = rule['extract'](self, page, vc_website)
+            if startups:
+                # Without a website there is no one to email, so a directory whose cards
+                # only link to internal pages goes to the LLM, which can fill websites in
+                with_website = [startup for startup in startups if startup.get('website')]
+                confident = (len(with_website) >= min_companies
+                             and len(with_website) >= LOCAL_MIN_WEBSITE_SHARE * len(startups))
+                if confident and len(with_website) < len(startups):
+                    print(f"Dropping {len(startups) - len(with_website)} directory entries without a website")
+                return (with_website if confident else startups), confident
+        startups = self.extract_startups_from_links(page, vc_website, ignore_domains)
+        confident = self.links_look_like_portfolio(page, vc_website, ignore_domains, min_companies)
+        return startups, confident
+
+    def parse_startups_json(self, content: str):
+        """Pull the JSON array of startups out of a model response. Returns None if there isn't one."""
+        # More aggressive cleaning of the response
+        cleaned_content = content.strip()
+        
+        # Remove markdown code blocks if present
+        if '```json' in cleaned_content:
+            cleaned_content = cleaned_content.split('```json')[1].split('```')[0].strip()
+        elif '```' in cleaned_content:
+            cleaned_content = cleaned_content.split('```')[1].split('```')[0].strip()
+        
+        # Find the JSON array
+        start_idx = cleaned_content.find('[')
+        end_idx = cleaned_content.rfind(']')
+        
+        if start_idx == -1:
+            print("Could not find JSON array markers")
+            return None
+        
+        json_str = cleaned_content[start_idx:end_idx+1] if end_idx > start_idx else cleaned_content[start_idx:]
+        
+        try:
+            startups = json.loads(json_str)
+        except json.JSONDecodeError as e:
+            # A dense chunk can hit max_tokens mid-array; keep the complete objects
+            last_object_end = json_str.rfind('}')
+            try:
+                startups = json.loads(json_str[:last_object_end + 1] + ']')
+                print(f"Recovered {len(startups)} startups from a truncated response")
+            except json.JSONDecodeError:
+                print(f"JSON parsing error: {str(e)}")
+                print(f"Attempted to parse: {json_str[:200]}...")
+                return None
+        if not isinstance(startups, list):
+            return None
+        return [startup for startup in startups if isinstance(startup, dict) and startup.get('name')]
+
+    def extract_startups_from_chunk(self, chunk: str, part: int, total_parts: int, splits: int = 0) -> List[Dict]:
+        """
+        Ask the model for the portfolio companies mentioned in one chunk of the page.
+        If the response is cut off at max_tokens, the chunk is split in half and each
+        half extracted again, so no companies are silently dropped.
+        """
+        prompt = (
+            "You are analyzing a venture capital firm's portfolio page. "
+            "Extract the portfolio companies from this page content. "
+            "Scripts and markup have been removed; links are shown as 'text [url]'.\n\n"
+            f"Page Content (part {part} of {total_parts}):\n{chunk}\n\n"
+            "Instructions:\n"
+            "1. Extract EVERY portfolio company/startup in this part of the page (return [] if there are none)\n"
+            "2. Extract their names and website URLs (this is REQUIRED)\n"
+            "3. Infer industry and location if you can, otherwise use \"\"\n"
+            "4. Return ONLY a JSON array - no explanations, no markdown - with one compact object "
+            "per company on its own line and exactly these keys:\n"
+            "[{\"name\": \"Company Name\", \"website\": \"https://company.com\", \"industry\": \"Fintech\", "
+            "\"location\": \"San Francisco, CA\"}]"
+        )
+
+        content, truncated = self.cached_completion(
+            model="gpt-4",  # Using GPT-4 for better extraction
+            messages=[
+                {"role": "system", "content": "You are a data extraction expert. Return only valid JSON arrays with no additional text."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            max_tokens=EXTRACTION_MAX_TOKENS
+        )
+        print(f"OpenAI Response (part {part}/{total_parts}): {content[:500]}...")  # Debug print
+        if truncated:
+            lines = chunk.split('\n')
+            if len(lines) > 1 and splits < EXTRACTION_MAX_SPLITS:
+                print(f"Response for part {part}/{total_parts} was cut off, splitting it in two")
+                middle = len(lines) // 2
+                return (self.extract_startups_from_chunk('\n'.join(lines[:middle]), part, total_parts, splits + 1)
+                        + self.extract_startups_from_chunk('\n'.join(lines[middle:]), part, total_parts, splits + 1))
+            print(f"Response for part {part}/{total_parts} was cut off, keeping the companies it returned")
+        return [self.add_contact_fields(startup) for startup in self.parse_startups_json(content) or []]
+
+    @staticmethod
+    def add_contact_fields(startup: Dict) -> Dict:
+        """Extraction only returns name, website, industry and location; contacts default to the careers inbox"""
+        domain = normalize_domain(startup.get('website', ''))
+        startup.setdefault('contact_name', 'Hiring Manager')
+        startup.setdefault('contact_email', f"careers@{domain}" if domain else '')
+        startup.setdefault('contact_linkedin', '')
+        return startup
+
+    def merge_startups(self, startup_lists: List[List[Dict]]) -> List[Dict]:
+        """Merge per-chunk results, keeping the first record seen for each company domain"""
+        merged = []
+        seen = set()
+        for startups in startup_lists:
+            for startup in startups:
+                key = normalize_domain(startup.get('website', '')) or startup['name'].strip().lower()
+                if key in seen:
+                    continue
+                seen.add(key)
+                merged.append(startup)
+        return merged
+
+    def extract_startups_from_page(self, html_content: str, vc_website: str):
+        """
+        Find the portfolio companies on one page. Companies are read from the page's
+        links when the structure is recognizable; otherwise the whole page is cleaned,
+        split into chunks and extracted in parallel by the LLM.
+        Returns (startups, page) so callers can keep using the parsed page.
+        """
+        page = self.parse_portfolio_page(html_content, vc_website)
+        startups, confident = self.extract_startups_locally(page, vc_website)
+        if confident:
+            print(f"Found {len(startups)} startups from page links, skipping LLM extraction")
+            return startups, page
+        print(f"Local parsing found only {len(startups)} startups, using LLM extraction")
+
+        chunks = self.chunk_page_lines(page.lines)
+        print(f"Split visible page content into {len(chunks)} chunks")
+        if not chunks:
+            return [], page
+
+        results = [[] for _ in chunks]
+        with ThreadPoolExecutor(max_workers=EXTRACTION_WORKERS) as executor:
+            futures = {
+                executor.submit(self.extract_startups_from_chunk, chunk, index + 1, len(chunks)): index
+                for index, chunk in enumerate(chunks)
+            }
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    print(f"Error extracting part {futures[future] + 1}: {str(e)}")
+
+        return self.merge_startups(results), page
+
+    def scrape_vc_startups(self, vc_website: str) -> List[Dict]:
+        """
+        Scrape startup information from a VC website using requests.
+        Returns a list of dictionaries containing startup details.
+        """
+        try:
+            html_content = self.fetch_page(vc_website)
+            
+            # Debug: Show what we got
+            print(f"Fetched {len(html_content)} characters from {vc_website}")
+
+            startups, _ = self.extract_startups_from_page(html_content, vc_website)
+            if not startups:
+                print("Empty startups array returned")
+                return self.create_fallback_startups(vc_website)
+            print(f"Successfully parsed {len(startups)} startups")
+            return startups
+            
+        except Exception as e:
+            print(f"Error scraping VC website: {str(e)}")
+            return []
+
+    def find_pagination_links(self, page: PortfolioPageParser, url: str) -> List[str]:
+        """Links on the same host that lead to further pages of the portfolio"""
+        host = urlparse(url).netloc.lower()
+        current = url.split('#')[0]
+        next_links = []
+        for link in page.links:
+            href = link['href'].split('#')[0]
+            if href == current or urlparse(href).netloc.lower() != host or href in next_links:
+                continue
+            text = ' '.join(link['texts'])
+            if 'next' in link['rel'].split() or PAGINATION_TEXT.match(text) or self.is_next_page_href(href, current):
+                next_links.append(href)
+        return next_links
+
+    @staticmethod
+    def is_next_page_href(href: str, current: str) -> bool:
+        """A page-numbered link to another page of the same listing, e.g. /portfolio?page=2 from /portfolio"""
+        match = PAGINATION_HREF.search(href)
+        if not match or int(match.group(2) or match.group(3)) == 0:
+            return False
+
+        def listing_path(url):
+            return re.sub(r'/page/\d+/?$', '', urlparse(url).path).rstrip('/')
+        return listing_path(href) == listing_path(current)
+
+    def crawl_page(self, url: str):
+        """Fetch one page of a crawl. Returns (startups, pagination links)."""
+        html_content = self.fetch_page(url)
+        print(f"Fetched {len(html_content)} characters from {url}")
+        startups, page = self.extract_startups_from_page(html_content, url)
+        return startups, self.find_pagination_links(page, url)
+
+    def crawl_vc_portfolios(self, vc_websites: List[str], max_depth: int = None,
+                            cancel_event: threading.Event = None, on_page=None) -> List[Dict]:
+        """
+        Scrape several VC portfolios at once, following pagination links up to
+        max_depth pages beyond each starting URL. Pages are fetched in parallel over a
+        pooled session, throttled per host. on_page(url, startups) is called as each
+        page finishes. Returns all startups, deduplicated by domain.
+        """
+        max_depth = self.crawl_max_depth if max_depth is None else max_depth
+        found = {vc_website: [] for vc_website in vc_websites}
+        reached = set()
+        visited = set(vc_websites)
+        frontier = [(vc_website, vc_website) for vc_website in vc_websites]
+
+        for depth in range(max_depth + 1):
+            if not frontier or (cancel_event is not None and cancel_event.is_set()):
+                break
+            next_frontier = []
+            with ThreadPoolExecutor(max_workers=CRAWL_WORKERS) as executor:
+                futures = {executor.submit(self.crawl_page, url): (url, seed) for url, seed in frontier}
+                for future in as_completed(futures):
+                    url, seed = futures[future]
+                    try:
+                        startups, next_links = future.result()
+                    except Exception as e:
+                        print(f"Error scraping VC website: {str(e)}")
+                        continue
+                    reached.add(seed)
+                    found[seed].append(startups)
+                    if on_page:
+                        on_page(url, startups)
+                    if depth < max_depth:
+                        for link in next_links:
+                            if link not in visited:
+                                visited.add(link)
+                                next_frontier.append((link, seed))
+            frontier = next_frontier
+
+        results = []
+        for vc_website in vc_websites:
+            startups = self.merge_startups(found[vc_website])
+            # Same behavior as scrape_vc_startups: a reachable page with no companies uses fallback data
+            if not startups and vc_website in reached:
+                startups = self.create_fallback_startups(vc_website)
+            results.append(startups)
+        startups = self.merge_startups(results)
+        print(f"Crawled {len(visited)} pages from {len(vc_websites)} VC websites, found {len(startups)} startups")
+        return startups
+
+    def create_fallback_startups(self, vc_website: str) -> List[Dict]:
+        """
+        Create fallback startup data when scraping fails.
+        Uses known startups from major VC firms.
+        """
+        # Determine which VC firm based on URL
+        vc_website_lower = vc_website.lower()
+        
+        fallback_data = []
+        
+        if 'sequoia' in vc_website_lower:
+            fallback_data = [
+                {"name": "Stripe", "website": "https://stripe.com", "industry": "Fintech", "stage": "Late Stage", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@stripe.com", "contact_linkedin": ""},
+                {"name": "DoorDash", "website": "https://doordash.com", "industry": "Food Delivery", "stage": "Public", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@doordash.com", "contact_linkedin": ""},
+                {"name": "Instacart", "website": "https://instacart.com", "industry": "Grocery Delivery", "stage": "Late Stage", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@instacart.com", "contact_linkedin": ""},
+                {"name": "Databricks", "website": "https://databricks.com", "industry": "Data Analytics", "stage": "Late Stage", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@databricks.com", "contact_linkedin": ""},
+                {"name": "Navan", "website": "https://navan.com", "industry": "Travel Tech", "stage": "Series G", "location": "Palo Alto, CA", "contact_name": "Hiring Manager", "contact_email": "careers@navan.com", "contact_linkedin": ""},
+            ]
+        elif 'ycombinator' in vc_website_lower or 'yc' in vc_website_lower:
+            fallback_data = [
+                {"name": "Airbnb", "website": "https://airbnb.com", "industry": "Hospitality", "stage": "Public", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@airbnb.com", "contact_linkedin": ""},
+                {"name": "Coinbase", "website": "https://coinbase.com", "industry": "Cryptocurrency", "stage": "Public", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@coinbase.com", "contact_linkedin": ""},
+                {"name": "Reddit", "website": "https://reddit.com", "industry": "Social Media", "stage": "Public", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@reddit.com", "contact_linkedin": ""},
+                {"name": "Instacart", "website": "https://instacart.com", "industry": "Grocery Delivery", "stage": "Late Stage", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@instacart.com", "contact_linkedin": ""},
+                {"name": "Brex", "website": "https://brex.com", "industry": "Fintech", "stage": "Series D", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@brex.com", "contact_linkedin": ""},
+            ]
+        elif 'a16z' in vc_website_lower or 'andreessen' in vc_website_lower:
+            fallback_data = [
+                {"name": "GitHub", "website": "https://github.com", "industry": "Developer Tools", "stage": "Acquired", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@github.com", "contact_linkedin": ""},
+                {"name": "Coinbase", "website": "https://coinbase.com", "industry": "Cryptocurrency", "stage": "Public", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@coinbase.com", "contact_linkedin": ""},
+                {"name": "Roblox", "website": "https://roblox.com", "industry": "Gaming", "stage": "Public", "location": "San Mateo, CA", "contact_name": "Hiring Manager", "contact_email": "careers@roblox.com", "contact_linkedin": ""},
+                {"name": "Instacart", "website": "https://instacart.com", "industry": "Grocery Delivery", "stage": "Late Stage", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@instacart.com", "contact_linkedin": ""},
+                {"name": "Dialpad", "website": "https://dialpad.com", "industry": "Communication", "stage": "Series E", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@dialpad.com", "contact_linkedin": ""},
+            ]
+        else:
+            # Generic tech startups
+            fallback_data = [
+                {"name": "Sample Startup 1", "website": "https://example1.com", "industry": "Software", "stage": "Series A", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@example1.com", "contact_linkedin": ""},
+                {"name": "Sample Startup 2", "website": "https://example2.com", "industry": "AI/ML", "stage": "Seed", "location": "New York, NY", "contact_name": "Hiring Manager", "contact_email": "careers@example2.com", "contact_linkedin": ""},
+                {"name": "Sample Startup 3", "website": "https://example3.com", "industry": "Fintech", "stage": "Series B", "location": "Austin, TX", "contact_name": "Hiring Manager", "contact_email": "careers@example3.com", "contact_linkedin": ""},
+            ]
+        
+        print(f"Using fallback data with {len(fallback_data)} startups")
+        return fallback_data
+
+    def build_email_system_prompt(self) -> str:
+        """
+        Instructions plus the candidate's profile. This is identical for every
+        startup in a batch and only the short startup message after it changes per
+        call. OpenAI only caches prompt prefixes of 1024+ tokens on newer models, so
+        this ~200-token prefix isn't cached today; keeping it stable costs nothing
+        and lets a longer prompt or newer EMAIL_MODEL benefit.
+        """
+        return (
+            "You write professional cold emails for new grad entry-level positions at startups.\n"
+            "\n"
+            "A full email should be personalized and include:\n"
+            "1. A brief introduction as a recent graduate\n"
+            "2. Why you're interested in the startup\n"
+            "3. Relevant skills and experience from your degree\n"
+            "4. How you can contribute to their early-stage company\n"
+            "5. A professional closing\n"
+            "Make it concise but impactful (3-4 paragraphs).\n"
+            "Do not include a salutation; it is added separately.\n"
+            "\n"
+            "Use this information about the candidate:\n"
+            f"Name: {self.user_info['name']}\n"
+            f"Degree: {self.user_info['degree']}\n"
+            f"Graduation Year: {self.user_info['graduation_year']}\n"
+            f"Skills: {self.user_info['skills']}\n"
+            f"Achievements: {self.user_info['achievements']}\n"
+            f"Location: {self.user_info['location']}"
+        )
+
+    def format_startup_details(self, startup_info: Dict) -> str:
+        return (
+            f"Startup: {startup_info['name']}\n"
+            f"Industry: {startup_info.get('industry', 'Tech')}\n"
+            f"Location: {startup_info.get('location', 'Remote')}\n"
+            f"Contact Person: {startup_info.get('contact_name', 'Hiring Manager')}\n"
+            f"Contact Email: {startup_info.get('contact_email', '')}"
+        )
+
+    def build_email_messages(self, prompt: str) -> List[Dict]:
+        return [
+            {"role": "system", "content": self.build_email_system_prompt()},
+            {"role": "user", "content": prompt}
+        ]
+
+    def complete_email(self, prompt: str, max_tokens: int, on_token=None, client=None) -> str:
+        """
+        Send one generation request after the shared system/profile prefix.
+        With on_token, the response is streamed and on_token(text) is called
+        with each piece as it arrives. client defaults to the openai module.
+        """
+        messages = self.build_email_messages(prompt)
+        with self.metrics.stage('generate_llm', model=EMAIL_MODEL, streamed=on_token is not None) as record:
+            if on_token is None:
+                response = self.rate_limited_completion(
+                    record,
+                    client,
+                    model=EMAIL_MODEL,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=max_tokens
+                )
+                self.record_usage(record, response.usage)
+                return response.choices[0].message.content.strip()
+
+            stream = self.rate_limited_completion(
+                record,
+                client,
+                model=EMAIL_MODEL,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            pieces = []
+            start = time.perf_counter()
+            for chunk in stream:
+                # With include_usage the final chunk carries token counts and no choices
+                self.record_usage(record, getattr(chunk, 'usage', None))
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content
+                if text:
+                    if not pieces:
+                        record['first_token_seconds'] = round(time.perf_counter() - start, 4)
+                    pieces.append(text)
+                    on_token(text)
+            return ''.join(pieces).strip()
+
+    def get_core_pitch(self, client=None) -> str:
+        """
+        The company-independent part of the email (background, skills, closing),
+        generated once per profile and reused for every startup in 'pitch' mode.
+        client defaults to the openai module.
+        """
+        key = json.dumps(self.user_info, sort_keys=True)
+        with self.core_pitch_lock:
+            if key not in self.core_pitches:
+                self.core_pitches[key] = self.complete_email(
+                    "Write the core of a cold email that works for any startup: 2 short paragraphs "
+                    "covering my relevant skills and experience from my degree and how I can contribute "
+                    "to an early-stage company, followed by a professional closing with my name. "
+                    "Do not mention any specific company. It will follow a company-specific opening paragraph.",
+                    max_tokens=350,
+                    client=client
+                )
+            return self.core_pitches[key]
+
+    def email_prompt(self, startup_info: Dict):
+        """
+        The per-startup request for the current mode: the whole email in 'full' mode,
+        or just the company-specific opening in 'pitch' mode. Returns (prompt, max_tokens).
+        """
+        if self.email_mode == 'pitch':
+            return (
+                "Write only the opening paragraph (2-3 sentences) of a cold email to this startup: "
+                "introduce me as a recent graduate and say why I'm interested in this company specifically. "
+                "No closing; the rest of the email follows.\n"
+                + self.format_startup_details(startup_info),
+                120
+            )
+        return (
+            "Write a professional cold email for a new grad entry-level position to this startup:\n"
+            + self.format_startup_details(startup_info),
+            500
+        )
+
+    def email_cache_key(self, startup_info: Dict) -> str:
+        return ScrapeCache.make_key(EMAIL_PROMPT_VERSION, EMAIL_MODEL, self.email_mode, self.user_info, startup_info)
+
+    def assemble_email(self, startup_info: Dict, email_content: str, core_pitch: str = None) -> str:
+        """Add the salutation, the core pitch ('pitch' mode) and the contact footer around the generated text"""
+        contact_name = startup_info.get('contact_name', 'Hiring Manager')
+        contact_email = startup_info.get('contact_email', '')
+        contact_linkedin = startup_info.get('contact_linkedin', '')
+
+        if contact_name.lower() != 'hiring manager':
+            salutation = f"Dear {contact_name},"
+        else:
+            salutation = "Dear Hiring Team,"
+
+        if core_pitch:
+            email_content = email_content + "\n\n" + core_pitch
+        
+        email_footer = f"\n\nContact Information:\n"\
+                     f"Startup: {startup_info['name']}\n"\
+                     f"Website: {startup_info['website']}\n"\
+                     f"Contact Person: {contact_name}\n"\
+                     f"Contact Email: {contact_email}\n"\
+                     f"LinkedIn: {contact_linkedin}"
+        
+        return salutation + "\n\n" + email_content + "\n\n" + email_footer
+
+    def generate_cold_email(self, startup_info: Dict, regenerate: bool = False, on_token=None) -> str:
+        """
+        Generate a personalized cold email for a new grad position using user information.
+        Emails are cached per profile, startup, model, mode and prompt version;
+        regenerate skips the cache and replaces the stored email. on_token(text)
+        receives the body as it streams in (not called for cached emails).
+        """
+        if not all(self.user_info.values()):
+            raise ValueError("Please fill in all your profile information first")
+
+        cache_key = self.email_cache_key(startup_info)
+        if not regenerate:
+            cached = self.cache.get_email(cache_key)
+            if cached is not None:
+                return cached
+
+        prompt, max_tokens = self.email_prompt(startup_info)
+        email_content = self.complete_email(prompt, max_tokens, on_token=on_token)
+
+        core_pitch = None
+        if self.email_mode == 'pitch':
+            core_pitch = self.get_core_pitch()
+            if on_token:
+                on_token("\n\n" + core_pitch)
+
+        email = self.assemble_email(startup_info, email_content, core_pitch)
+        self.cache.put_email(cache_key, email)
+        return email
+
+    def package_email(self, startup: Dict, email: str) -> Dict:
+        """Add the recipient and subject needed for draft creation"""
+        contact_email = startup.get('contact_email', '')
+        if not contact_email:
+            # Directory entries without a website get a draft with no recipient to fill in
+            domain = normalize_domain(startup.get('website', ''))
+            contact_email = f"careers@{domain}" if domain else ''
+
+        subject = f"New Graduate Interested in {startup['name']} - {self.user_info['degree']}"
+
+        return {
+            'startup_name': startup['name'],
+            'website': startup.get('website', ''),
+            'to_email': contact_email,
+            'subject': subject,
+            'body': email
+        }
+
+    def build_email_data(self, startup: Dict, regenerate: bool = False, on_token=None) -> Dict:
+        """
+        Generate the cold email for one startup and package it for draft creation.
+        """
+        email = self.generate_cold_email(startup, regenerate=regenerate, on_token=on_token)
+        return self.package_email(startup, email)
+
+    @staticmethod
+    def should_regenerate(startup: Dict, regenerate) -> bool:
+        """regenerate is True/False for the whole batch, or a collection of startup names"""
+        if isinstance(regenerate, bool):
+            return regenerate
+        return startup['name'].strip().lower() in {name.strip().lower() for name in regenerate}
+
+    def report_email_result(self, startup: Dict, email_data: Dict, error: Exception, on_result=None):
+        """Record a finished email (or its failure) in the tracker and notify the caller"""
+        if error is None:
+            self.tracker.record_email(email_data)
+            if self.run_id is not None:
+                self.journal.record_email(self.run_id, email_data)
+        else:
+            self.tracker.record_failure(startup['name'], startup.get('website', ''), error)
+        if on_result:
+            on_result(startup, email_data, error)
+
+    def generate_emails_concurrently(self, startups: List[Dict], on_result=None, max_workers: int = None,
+                                     cancel_event: threading.Event = None, regenerate=False, on_token=None) -> List[Dict]:
+        """
+        Generate cold emails for all startups using a bounded pool of worker threads.
+        on_result(startup, email_data, error) is called on the calling thread as each
+        email finishes. Setting cancel_event drops startups that haven't started yet.
+        regenerate is True to bypass the email cache for every startup, or a collection
+        of startup names to regenerate just those. on_token(startup, text) streams
+        each email body as it is written; it is called from the worker threads.
+        Returns the generated emails in the original startup order.
+        """
+        max_workers = max_workers or self.email_workers
+        results = [None] * len(startups)
+        for index, email_data in self.resumed_emails(startups, regenerate).items():
+            results[index] = email_data
+            if on_result:
+                on_result(startups[index], email_data, None)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.build_email_data, startup, self.should_regenerate(startup, regenerate),
+                                (lambda text, startup=startup: on_token(startup, text)) if on_token else None): index
+                for index, startup in enumerate(startups) if results[index] is None
+            }
+            for future in as_completed(futures):
+                if cancel_event is not None and cancel_event.is_set():
+                    for pending in futures:
+                        pending.cancel()
+                if future.cancelled():
+                    continue
+                index = futures[future]
+                startup = startups[index]
+                try:
+                    results[index] = future.result()
+                    error = None
+                except Exception as e:
+                    error = e
+                self.report_email_result(startup, results[index], error, on_result)
+
+        return [email_data for email_data in results if email_data is not None]
+
+    def load_batch_state(self, state_path: str):
+        if not os.path.exists(state_path):
+            return None
+        with open(state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_batch_state(self, state_path: str, state: Dict):
+        # Write then rename so a crash mid-write never leaves a corrupt state file
+        temp_path = state_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp_path, state_path)
+
+    def batch_api_call(self, client, call, *args, poll_interval: float = BATCH_POLL_SECONDS):
+        """
+        Call the Batch API, riding out dropped connections and server errors: a batch
+        can run for 24 hours and the SDK doesn't retry, so one blip mustn't end the run.
+        Gives up after BATCH_MAX_ERRORS failures in a row; the state file is kept for resuming.
+        """
+        for attempt in range(BATCH_MAX_ERRORS):
+            try:
+                return call(*args)
+            except (client.APIConnectionError, client.InternalServerError) as e:
+                if attempt == BATCH_MAX_ERRORS - 1:
+                    raise
+                print(f"Batch API request failed ({type(e).__name__}), retrying in {poll_interval:.0f}s")
+                time.sleep(poll_interval)
+
+    def generate_emails_batch(self, startups: List[Dict], state_path: str = BATCH_STATE_PATH, client=None,
+                              poll_interval: float = BATCH_POLL_SECONDS, on_result=None, regenerate=False) -> List[Dict]:
+        """
+        Generate emails through the OpenAI Batch API instead of one request each:
+        all uncached requests are written to a JSONL file, submitted as one batch
+        and polled until done, then mapped back to their startups. Progress is kept
+        in state_path, so re-running the same job after a crash resumes polling the
+        submitted batch instead of paying for it again. client defaults to the openai
+        module; pass any object with the same files/batches/chat API and error types
+        (e.g. a local stand-in); 'pitch' mode writes its core pitch through it too.
+        Returns the generated emails in the original startup order.
+        """
+        if not all(self.user_info.values()):
+            raise ValueError("Please fill in all your profile information first")
+        client = client or load_openai()
+
+        job_key = ScrapeCache.make_key(EMAIL_PROMPT_VERSION, EMAIL_MODEL, self.email_mode, self.user_info, startups)
+        state = self.load_batch_state(state_path)
+        if state and state.get('job_key') != job_key:
+            print(f"Ignoring {state_path}: it belongs to a different job (batch {state.get('batch_id')})")
+            state = None
+
+        results = [None] * len(startups)
+        if state is None:
+            pending = []
+            resumed = self.resumed_emails(startups, regenerate)
+            for index, startup in enumerate(startups):
+                if index in resumed:
+                    results[index] = resumed[index]
+                    if on_result:
+                        on_result(startup, results[index], None)
+                    continue
+                cached = None
+                if not self.should_regenerate(startup, regenerate):
+                    cached = self.cache.get_email(self.email_cache_key(startup))
+                if cached is None:
+                    pending.append(index)
+                else:
+                    results[index] = self.package_email(startup, cached)
+                    self.report_email_result(startup, results[index], None, on_result)
+            if not pending:
+                return [email_data for email_data in results if email_data is not None]
+
+            input_path = os.path.splitext(state_path)[0] + '_input.jsonl'
+            state = {'job_key': job_key, 'pending': pending, 'batch_id': None, 'input_path': input_path,
+                     'core_pitch': self.get_core_pitch(client) if self.email_mode == 'pitch' else None}
+            with open(input_path, 'w', encoding='utf-8') as f:
+                for index in pending:
+                    prompt, max_tokens = self.email_prompt(startups[index])
+                    f.write(json.dumps({
+                        'custom_id': f"email-{index}",
+                        'method': 'POST',
+                        'url': '/v1/chat/completions',
+                        'body': {
+                            'model': EMAIL_MODEL,
+                            'messages': self.build_email_messages(prompt),
+                            'temperature': 0.7,
+                            'max_tokens': max_tokens
+                        }
+                    }) + '\n')
+            with open(input_path, 'rb') as f:
+                input_file = client.files.create(file=f, purpose='batch')
+            batch = client.batches.create(input_file_id=input_file.id, endpoint='/v1/chat/completions',
+                                          completion_window='24h')
+            state['batch_id'] = batch.id
+            self.save_batch_state(state_path, state)
+            print(f"Submitted batch {batch.id} with {len(pending)} requests")
+        else:
+            print(f"Resuming batch {state['batch_id']} with {len(state['pending'])} requests")
+            for index, startup in enumerate(startups):
+                if index in state['pending']:
+                    continue
+                cached = self.cache.get_email(self.email_cache_key(startup))
+                if cached is not None:
+                    results[index] = self.package_email(startup, cached)
+                    self.report_email_result(startup, results[index], None, on_result)
+
+        with self.metrics.stage('openai_batch', batch_id=state['batch_id'], requests=len(state['pending'])) as metric:
+            while True:
+                batch = self.batch_api_call(client, client.batches.retrieve, state['batch_id'],
+                                            poll_interval=poll_interval)
+                if batch.status in ('completed', 'failed', 'expired', 'cancelled'):
+                    break
+                counts = getattr(batch, 'request_counts', None)
+                if counts is not None:
+                    print(f"Batch {batch.id}: {batch.status} ({counts.completed}/{counts.total} done)")
+                else:
+                    print(f"Batch {batch.id}: {batch.status}")
+                time.sleep(poll_interval)
+
+            if batch.status != 'completed':
+                # Nothing more will come from this batch; the next run starts a fresh one
+                os.remove(state_path)
+                raise RuntimeError(f"Batch {batch.id} ended with status '{batch.status}'")
+
+            outputs = {}
+            for file_id in (batch.output_file_id, getattr(batch, 'error_file_id', None)):
+                if not file_id:
+                    continue
+                content = self.batch_api_call(client, client.files.content, file_id,
+                                              poll_interval=poll_interval).text
+                metric['bytes'] = metric.get('bytes', 0) + len(content.encode('utf-8'))
+                for line in content.splitlines():
+                    if line.strip():
+                        record = json.loads(line)
+                        outputs[record['custom_id']] = record
+                        usage = ((record.get('response') or {}).get('body') or {}).get('usage') or {}
+                        metric['prompt_tokens'] = metric.get('prompt_tokens', 0) + usage.get('prompt_tokens', 0)
+                        metric['completion_tokens'] = metric.get('completion_tokens', 0) + usage.get('completion_tokens', 0)
+
+        for index in state['pending']:
+            startup = startups[index]
+            record = outputs.get(f"email-{index}")
+            try:
+                if record is None:
+                    raise RuntimeError("No result in batch output")
+                response = record.get('response') or {}
+                if record.get('error') or response.get('status_code') != 200:
+                    raise RuntimeError(f"Batch request failed: {record.get('error') or response.get('body')}")
+                content = response['body']['choices'][0]['message']['content'].strip()
+                email = self.assemble_email(startup, content, state['core_pitch'])
+                self.cache.put_email(self.email_cache_key(startup), email)
+                results[index] = self.package_email(startup, email)
+                error = None
+            except Exception as e:
+                error = e
+            self.report_email_result(startup, results[index], error, on_result)
+
+        os.remove(state_path)
+        if os.path.exists(state['input_path']):
+            os.remove(state['input_path'])
+        return [email_data for email_data in results if email_data is not None]
+
+    def run_key(self, vc_websites: List[str], max_depth: int = None) -> str:
+        """Runs resume each other when they search the same URLs, to the same depth, for the same profile"""
+        max_depth = self.crawl_max_depth if max_depth is None else max_depth
+        return ScrapeCache.make_key(sorted(vc_websites), max_depth, EMAIL_PROMPT_VERSION, self.email_mode, self.user_info)
+
+    def has_unfinished_run(self, vc_websites: List[str], max_depth: int = None) -> bool:
+        return self.journal.find_unfinished(self.run_key(vc_websites, max_depth)) is not None
+
+    def crawl_or_resume(self, vc_websites: List[str], max_depth: int = None, resume: bool = True,
+                        cancel_event: threading.Event = None, on_page=None) -> List[Dict]:
+        """
+        Start a journaled run, or with resume pick up the unfinished run for the same
+        URLs, depth and profile, reusing the startups it already scraped. Emails and
+        drafts it completed are then skipped by the generation and draft steps.
+        """
+        run_key = self.run_key(vc_websites, max_depth)
+        run_id = self.journal.find_unfinished(run_key) if resume else None
+        if run_id is None:
+            self.run_id = self.journal.start(run_key, {'vc_websites': vc_websites, 'max_depth': max_depth})
+        else:
+            self.run_id = run_id
+            startups = self.journal.scraped_startups(run_id)
+            if startups is not None:
+                print(f"Resuming run {run_id} with its {len(startups)} scraped startups")
+                return startups
+
+        startups = self.crawl_vc_portfolios(vc_websites, max_depth=max_depth, cancel_event=cancel_event, on_page=on_page)
+        if startups and not (cancel_event is not None and cancel_event.is_set()):
+            self.journal.record_scraped(self.run_id, startups)
+        return startups
+
+    def resumed_emails(self, startups: List[Dict], regenerate=False) -> Dict[int, Dict]:
+        """Emails the current run generated before it was interrupted, by startup index"""
+        if self.run_id is None:
+            return {}
+        generated = self.journal.generated_emails(self.run_id)
+        resumed = {}
+        for index, startup in enumerate(startups):
+            email_data = generated.get(RunJournal.startup_key(startup['name'], startup.get('website', '')))
+            if email_data is not None and not self.should_regenerate(startup, regenerate):
+                resumed[index] = email_data
+        if resumed:
+            print(f"Resuming: {len(resumed)} emails were already generated in this run")
+        return resumed
+
+    def complete_run(self):
+        """Close the journaled run so the next search with the same URLs starts fresh"""
+        if self.run_id is not None:
+            self.journal.finish(self.run_id)
+            self.run_id = None
+
+    def filter_new_startups(self, startups: List[Dict]):
+        """
+        Record the startups in the tracker and drop companies that were already
+        contacted in an earlier run. Returns (new startups, skipped startups).
+        """
+        self.tracker.record_startups(startups)
+        contacted = self.tracker.contacted_keys()
+        new, skipped = [], []
+        for startup in startups:
+            key = ApplicationTracker.company_key(startup['name'], startup.get('website', ''))
+            (skipped if key in contacted else new).append(startup)
+        return new, skipped
+
+    def load_profile(self, path: str):
+        """Load user_info from a JSON file with the same fields as the profile form"""
+        with open(path, 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+        missing = [field for field in self.user_info if not str(profile.get(field, '')).strip()]
+        if missing:
+            raise ValueError(f"Profile is missing: {', '.join(missing)}")
+        self.user_info = {field: str(profile[field]).strip() for field in self.user_info}
+
+    @staticmethod
+    def load_url_list(path: str) -> List[str]:
+        """Read VC URLs, one per line; blank lines and # comments are ignored"""
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = [line.split('#')[0].strip() for line in f]
+        return [line for line in lines if line]
 
-    def create_gmail_draft(self, to_email: str, subject: str, body: str):
-        """Create a draft email in Gmail"""
+    def run_headless(self, vc_websites: List[str], output_path: str, create_drafts: bool = False,
+                     max_depth: int = None, regenerate=False, skip_contacted: bool = True,
+                     use_batch: bool = False, batch_state: str = BATCH_STATE_PATH, resume: bool = True) -> bool:
+        """
+        Run the whole pipeline without a display: crawl, generate emails (written to
+        output_path as JSON lines as they finish), then optionally create Gmail drafts.
+        With resume, an interrupted run for the same URLs continues from its last checkpoint.
+        Returns True if every email was generated (and drafted, if requested).
+        """
+        self.metrics.start_run('headless')
         try:
-            message = MIMEText(body)
-            message['to'] = to_email
-            message['subject'] = subject
-            raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
-            
-            draft = {
-                'message': {
-                    'raw': raw_message
-                }
-            }
-            
-            draft_result = self.gmail_service.users().drafts().create(
-                userId='me', body=draft).execute()
-            
-            return draft_result
-        except Exception as e:
-            raise Exception(f"Error creating draft: {str(e)}")
+            succeeded = self.run_headless_pipeline(vc_websites, output_path, create_drafts, max_depth, regenerate,
+                                                   skip_contacted, use_batch, batch_state, resume)
+            if succeeded:
+                self.complete_run()
+            return succeeded
+        finally:
+            print(self.metrics.finish_run())
+
+    def run_headless_pipeline(self, vc_websites: List[str], output_path: str, create_drafts: bool, max_depth: int,
+                              regenerate, skip_contacted: bool, use_batch: bool, batch_state: str,
+                              resume: bool = True) -> bool:
+        if create_drafts:
+            # Fail before spending tokens if drafts can't be created
+            self.authenticate_gmail(interactive=False)
+
+        startups = self.crawl_or_resume(vc_websites, max_depth=max_depth, resume=resume)
+        if not startups:
+            print("No startups found. Please check the VC website URLs.")
+            return False
+
+        if skip_contacted:
+            startups, skipped = self.filter_new_startups(startups)
+            if skipped:
+                print(f"Skipping {len(skipped)} companies already contacted")
+            if not startups:
+                print("Every startup found has already been contacted.")
+                return True
+        else:
+            self.tracker.record_startups(startups)
+
+        print(f"Found {len(startups)} startups. Generating emails...")
+        failures = 0
+
+        with open(output_path, 'w', encoding='utf-8') as output:
+            def write_result(startup, email_data, error):
+                nonlocal failures
+                if error is not None:
+                    failures += 1
+                    print(f"Error generating email for {startup['name']}: {str(error)}")
+                    return
+                output.write(json.dumps(email_data) + '\n')
+                output.flush()
+                print(f"Generated email for {email_data['startup_name']}")
+
+            if use_batch:
+                self.generated_emails = self.generate_emails_batch(startups, state_path=batch_state,
+                                                                   on_result=write_result, regenerate=regenerate)
+            else:
+                self.generated_emails = self.generate_emails_concurrently(startups, on_result=write_result,
+                                                                         regenerate=regenerate)
+
+        print(f"Wrote {len(self.generated_emails)} emails to {output_path}")
+        if not create_drafts or not self.generated_emails:
+            return failures == 0
+
+        summary = self.create_gmail_drafts_batch(self.generated_emails)
+        print(f"Draft summary: {len(summary['succeeded'])} succeeded, {len(summary['skipped'])} already drafted, "
+              f"{len(summary['retried'])} retried, {len(summary['failed'])} failed")
+        for failure in summary['failed']:
+            print(f"Failed: {failure}")
+        return failures == 0 and not summary['failed']
+
+class NewGradJobAgent(JobPipeline):
+    def __init__(self):
+        super().__init__()
+        self.setup_gui()
+        # Slow imports and Gmail setup happen while the window is already up
+        threading.Thread(target=self.warm_up_in_background, daemon=True).start()
 
     def setup_gui(self):
         self.window = tk.Tk()
@@ -120,10 +2601,34 @@ class NewGradJobAgent:
         search_frame = ttk.LabelFrame(self.window, text="Search Jobs", padding="5")
         search_frame.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
 
-        ttk.Label(search_frame, text="VC Website URL:").grid(row=0, column=0, padx=5, pady=2, sticky="w")
+        ttk.Label(search_frame, text="VC Website URL(s):").grid(row=0, column=0, padx=5, pady=2, sticky="w")
         self.url_entry = ttk.Entry(search_frame, width=60)
         self.url_entry.grid(row=0, column=1, padx=5, pady=2, sticky="w")
 
+        ttk.Label(search_frame, text="Follow Pages:").grid(row=1, column=0, padx=5, pady=2, sticky="w")
+        self.depth_spinbox = ttk.Spinbox(search_frame, from_=0, to=10, width=5)
+        self.depth_spinbox.set(self.crawl_max_depth)
+        self.depth_spinbox.grid(row=1, column=1, padx=5, pady=2, sticky="w")
+
+        self.core_pitch_var = tk.BooleanVar(value=self.email_mode == 'pitch')
+        ttk.Checkbutton(search_frame, text="Reuse one core pitch for every email (faster, fewer tokens)",
+                        variable=self.core_pitch_var).grid(row=2, column=1, padx=5, pady=2, sticky="w")
+
+        ttk.Label(search_frame, text="Regenerate:").grid(row=3, column=0, padx=5, pady=2, sticky="w")
+        self.regenerate_entry = ttk.Entry(search_frame, width=60)
+        self.regenerate_entry.grid(row=3, column=1, padx=5, pady=2, sticky="w")
+        self.regenerate_all_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(search_frame, text="Regenerate all (ignore saved emails)",
+                        variable=self.regenerate_all_var).grid(row=3, column=2, padx=5, pady=2, sticky="w")
+
+        self.skip_contacted_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(search_frame, text="Skip companies already contacted",
+                        variable=self.skip_contacted_var).grid(row=4, column=1, padx=5, pady=2, sticky="w")
+
+        self.stream_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(search_frame, text="Show emails as they're written",
+                        variable=self.stream_var).grid(row=4, column=2, padx=5, pady=2, sticky="w")
+
         ttk.Button(search_frame, text="Search and Generate Emails", 
                   command=self.search_startups_and_generate_emails).grid(row=0, column=2, padx=5, pady=2)
 
@@ -140,22 +2645,82 @@ class NewGradJobAgent:
         self.gmail_status = ttk.Label(gmail_frame, text="Not authenticated")
         self.gmail_status.grid(row=0, column=2, padx=5, pady=5)
 
-        # Results Frame
-        self.results_text = tk.Text(self.window, height=20, width=120)
-        self.results_text.grid(row=3, column=0, padx=10, pady=5, sticky="nsew")
-        scrollbar = ttk.Scrollbar(self.window, command=self.results_text.yview)
-        scrollbar.grid(row=3, column=1, sticky="ns")
-        self.results_text.config(yscrollcommand=scrollbar.set)
+        ttk.Button(gmail_frame, text="Import Tracker from Excel", 
+                  command=self.import_tracker).grid(row=0, column=3, padx=5, pady=5)
+
+        ttk.Button(gmail_frame, text="Export Tracker to Excel", 
+                  command=self.export_tracker).grid(row=0, column=4, padx=5, pady=5)
+
+        # Results Frame: a filterable list of startups (no email bodies), a detail pane
+        # that loads the selected email from the tracker, and a short run log
+        results_frame = ttk.Frame(self.window)
+        results_frame.grid(row=3, column=0, padx=10, pady=5, sticky="nsew")
+        results_frame.grid_rowconfigure(1, weight=1)
+        results_frame.grid_columnconfigure(0, weight=1)
+
+        filter_frame = ttk.Frame(results_frame)
+        filter_frame.grid(row=0, column=0, sticky="ew", pady=(0, 5))
+        ttk.Label(filter_frame, text="Show:").pack(side=tk.LEFT, padx=5)
+        self.status_filter_var = tk.StringVar(value='All')
+        status_filter = ttk.Combobox(filter_frame, textvariable=self.status_filter_var, values=list(RESULT_FILTERS),
+                                     state="readonly", width=12)
+        status_filter.pack(side=tk.LEFT)
+        status_filter.bind("<<ComboboxSelected>>", lambda event: self.refresh_results())
+        ttk.Label(filter_frame, text="Search:").pack(side=tk.LEFT, padx=5)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add('write', lambda *args: self.schedule_results_refresh())
+        ttk.Entry(filter_frame, textvariable=self.search_var, width=30).pack(side=tk.LEFT)
+        self.results_count_label = ttk.Label(filter_frame, text="")
+        self.results_count_label.pack(side=tk.LEFT, padx=10)
+
+        panes = ttk.PanedWindow(results_frame, orient=tk.HORIZONTAL)
+        panes.grid(row=1, column=0, sticky="nsew")
+        list_frame = ttk.Frame(panes)
+        self.results_list = ttk.Treeview(list_frame, columns=('company', 'status', 'to'), show='headings',
+                                         selectmode='browse', height=15)
+        for column, heading, width in (('company', 'Company', 180), ('status', 'Status', 110), ('to', 'To', 200)):
+            self.results_list.heading(column, text=heading)
+            self.results_list.column(column, width=width)
+        list_scrollbar = ttk.Scrollbar(list_frame, command=self.results_list.yview)
+        self.results_list.config(yscrollcommand=list_scrollbar.set)
+        self.results_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        list_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.results_list.bind('<<TreeviewSelect>>', lambda event: self.show_result_detail(self.selected_result()))
+        panes.add(list_frame, weight=1)
+
+        detail_frame = ttk.Frame(panes)
+        self.detail_text = tk.Text(detail_frame, height=15, width=70, wrap=tk.WORD, state=tk.DISABLED)
+        detail_scrollbar = ttk.Scrollbar(detail_frame, command=self.detail_text.yview)
+        self.detail_text.config(yscrollcommand=detail_scrollbar.set)
+        self.detail_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        detail_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        panes.add(detail_frame, weight=2)
+
+        self.log_text = tk.Text(results_frame, height=5, state=tk.DISABLED)
+        self.log_text.grid(row=2, column=0, sticky="ew", pady=(5, 0))
+
+        self.result_rows = {}  # company key -> list row (company, status, to), in the order results arrived
+        self.visible_results = 0
+        self.stream_buffers = {}  # company key -> pieces of an email still being written
+        self.results_refresh_pending = None
+        self.load_result_rows(self.tracker.list_results())
 
         # Status Frame
         status_frame = ttk.LabelFrame(self.window, text="Status", padding="5")
         status_frame.grid(row=4, column=0, padx=10, pady=5, sticky="ew")
         self.status_label = ttk.Label(status_frame, text="Ready")
         self.status_label.pack()
+        self.progress_bar = ttk.Progressbar(status_frame, mode='determinate', length=400)
+        self.progress_bar.pack(pady=2)
+        self.cancel_button = ttk.Button(status_frame, text="Cancel", command=self.cancel_job, state=tk.DISABLED)
+        self.cancel_button.pack(pady=2)
+
+        self.jobs = BackgroundJobExecutor(self.window)
 
         # Configure grid weights
         self.window.grid_rowconfigure(3, weight=1)
         self.window.grid_columnconfigure(0, weight=1)
+        self.refresh_results()
 
     def handle_gmail_auth(self):
         """Handle Gmail authentication"""
@@ -174,6 +2739,10 @@ class NewGradJobAgent:
             messagebox.showerror("Error", f"Authentication failed: {str(e)}")
             self.status_label.config(text="Authentication failed")
 
+    def warm_up_in_background(self):
+        if self.warm_up():
+            self.jobs.post(lambda: self.gmail_status.config(text="✓ Authenticated"))
+
     def create_all_drafts(self):
         """Create Gmail drafts for all generated emails"""
         if not self.gmail_service:
@@ -183,30 +2752,75 @@ class NewGradJobAgent:
         if not self.generated_emails:
             messagebox.showerror("Error", "No emails to create drafts from. Please generate emails first.")
             return
-        
+
+        self.start_job("Creating Gmail drafts...", self.create_drafts_job, list(self.generated_emails))
+
+    def create_drafts_job(self, emails: List[Dict]):
+        """Background job: create Gmail drafts in batches with retries"""
         try:
-            self.status_label.config(text="Creating Gmail drafts...")
-            self.window.update()
-            
-            draft_count = 0
-            for email_data in self.generated_emails:
-                try:
-                    draft = self.create_gmail_draft(
-                        to_email=email_data['to_email'],
-                        subject=email_data['subject'],
-                        body=email_data['body']
-                    )
-                    draft_count += 1
-                    self.results_text.insert(tk.END, f"\n✓ Created draft for {email_data['startup_name']}\n")
-                    self.window.update()
-                except Exception as e:
-                    self.results_text.insert(tk.END, f"\n✗ Failed to create draft for {email_data['startup_name']}: {str(e)}\n")
-            
-            self.status_label.config(text=f"Created {draft_count} Gmail drafts!")
-            messagebox.showinfo("Success", f"Created {draft_count} Gmail drafts! Check your Gmail drafts folder.")
+            # Emails drafted before (this session or an interrupted run) are skipped
+            completed = sum(1 for email_data in emails if email_data.get('draft_id'))
+
+            def show_result(email_data, draft, error):
+                nonlocal completed
+                completed += 1
+                self.jobs.post(self.show_draft_result, email_data, error)
+                self.jobs.post(self.update_progress, completed, len(emails), f"Creating Gmail drafts... ({completed}/{len(emails)})")
+
+            summary = self.create_gmail_drafts_batch(emails, on_result=show_result, cancel_event=self.jobs.cancel_event)
+            draft_count = len(summary['succeeded'])
+
+            summary_text = (
+                f"\nDraft summary: {draft_count} succeeded, {len(summary['skipped'])} already drafted, "
+                f"{len(summary['retried'])} retried, {len(summary['failed'])} failed\n"
+            )
+            if summary['retried']:
+                summary_text += f"Retried: {', '.join(summary['retried'])}\n"
+            for failure in summary['failed']:
+                summary_text += f"Failed: {failure}\n"
+            print(summary_text)
+            self.jobs.post(self.append_result, summary_text)
+
+            if self.jobs.is_cancelled():
+                self.jobs.post(self.set_status, f"Cancelled after creating {draft_count} Gmail drafts")
+                return
+            if not summary['failed']:
+                self.complete_run()
+
+            self.jobs.post(self.set_status, f"Created {draft_count} Gmail drafts!")
+            self.jobs.post(messagebox.showinfo, "Success", f"Created {draft_count} Gmail drafts! Check your Gmail drafts folder.")
+        except Exception as e:
+            self.jobs.post(messagebox.showerror, "Error", f"Error creating drafts: {str(e)}")
+            self.jobs.post(self.set_status, "Error creating drafts")
+
+    def import_tracker(self):
+        """Merge an existing Excel tracker into the application tracker"""
+        path = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx")])
+        if not path:
+            return
+        self.start_job("Importing applications...", self.import_tracker_job, path)
+
+    def import_tracker_job(self, path: str):
+        """Background job: import the spreadsheet, then show the merged results"""
+        try:
+            count = self.tracker.import_xlsx(path)
+            self.jobs.post(self.set_status, f"Imported {count} applications from {os.path.basename(path)}")
+            self.jobs.post(self.reload_results, self.tracker.list_results())
+        except Exception as e:
+            self.jobs.post(messagebox.showerror, "Error", f"Import failed: {str(e)}")
+            self.jobs.post(self.set_status, "Import failed")
+
+    def export_tracker(self):
+        """Write every tracked application to an Excel file"""
+        path = filedialog.asksaveasfilename(defaultextension=".xlsx", initialfile="new_grad_jobs.xlsx",
+                                            filetypes=[("Excel files", "*.xlsx")])
+        if not path:
+            return
+        try:
+            count = self.tracker.export_xlsx(path)
+            self.status_label.config(text=f"Exported {count} applications to {os.path.basename(path)}")
         except Exception as e:
-            messagebox.showerror("Error", f"Error creating drafts: {str(e)}")
-            self.status_label.config(text="Error creating drafts")
+            messagebox.showerror("Error", f"Export failed: {str(e)}")
 
     def save_user_info(self):
         """Save user information from the GUI entries"""
@@ -220,269 +2834,363 @@ class NewGradJobAgent:
         }
         self.status_label.config(text="Profile saved successfully!")
 
-    def scrape_vc_startups(self, vc_website: str) -> List[Dict]:
+    def search_startups_and_generate_emails(self):
         """
-        Scrape startup information from a VC website using requests.
-        Returns a list of dictionaries containing startup details.
+        Main function to scrape startups and generate cold emails for new grad positions.
         """
+        vc_websites = [url for url in re.split(r'[\s,]+', self.url_entry.get()) if url]
+        if not vc_websites:
+            messagebox.showerror("Error", "Please enter a VC website URL")
+            return
+
         try:
-            # Add headers to avoid being blocked
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(vc_website, headers=headers, timeout=15)
-            response.raise_for_status()
-            
-            # Get the content of the page
-            html_content = response.text
-            
-            # Debug: Show what we got
-            print(f"Fetched {len(html_content)} characters from {vc_website}")
-            
-            # Use a more targeted approach based on common VC website patterns
-            prompt = (
-                "You are analyzing a venture capital firm's portfolio page. "
-                "Extract information about portfolio companies/startups from this HTML content.\n\n"
-                f"HTML Content (first 8000 chars):\n{html_content[:8000]}\n\n"
-                "CRITICAL: Look for company/startup names, URLs, and any descriptive information. "
-                "Even if limited information is available, extract what you can find.\n\n"
-                "Instructions:\n"
-                "1. Find at least 5-10 portfolio companies/startups\n"
-                "2. Extract their names and website URLs (this is REQUIRED)\n"
-                "3. Try to infer or extract: industry, stage, location\n"
-                "4. For contact info: Use 'careers@[company-domain]' as email, leave contact_name as 'Hiring Manager'\n"
-                "5. Return ONLY valid JSON - no explanations, no markdown, just the JSON array\n\n"
-                "Required JSON format (return array of 5-10 companies):\n"
-                "[\n"
-                "  {\n"
-                "    \"name\": \"Company Name\",\n"
-                "    \"website\": \"https://company.com\",\n"
-                "    \"industry\": \"Software/AI/Fintech/etc\",\n"
-                "    \"stage\": \"Series A\",\n"
-                "    \"location\": \"San Francisco, CA\",\n"
-                "    \"contact_name\": \"Hiring Manager\",\n"
-                "    \"contact_email\": \"careers@company.com\",\n"
-                "    \"contact_linkedin\": \"\"\n"
-                "  }\n"
-                "]\n\n"
-                "IMPORTANT: Return valid JSON only. Start with [ and end with ]."
-            )
-            
-            response = openai.chat.completions.create(
-                model="gpt-4",  # Using GPT-4 for better extraction
-                messages=[
-                    {"role": "system", "content": "You are a data extraction expert. Return only valid JSON arrays with no additional text."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=2000
-            )
-            
-            content = response.choices[0].message.content
-            print(f"OpenAI Response: {content[:500]}...")  # Debug print
-            
-            # More aggressive cleaning of the response
-            cleaned_content = content.strip()
-            
-            # Remove markdown code blocks if present
-            if '```json' in cleaned_content:
-                cleaned_content = cleaned_content.split('```json')[1].split('```')[0].strip()
-            elif '```' in cleaned_content:
-                cleaned_content = cleaned_content.split('```')[1].split('```')[0].strip()
-            
-            # Find the JSON array
-            start_idx = cleaned_content.find('[')
-            end_idx = cleaned_content.rfind(']')
-            
-            if start_idx == -1 or end_idx == -1:
-                print("Could not find JSON array markers")
-                # Try to create a manual fallback
-                return self.create_fallback_startups(vc_website)
-            
-            json_str = cleaned_content[start_idx:end_idx+1]
-            
-            try:
-                startups = json.loads(json_str)
+            max_depth = max(0, int(self.depth_spinbox.get()))
+        except ValueError:
+            max_depth = self.crawl_max_depth
+
+        if self.regenerate_all_var.get():
+            regenerate = True
+        else:
+            regenerate = [name for name in self.regenerate_entry.get().split(',') if name.strip()]
+
+        # The running job reads email_mode, so only switch it once nothing is running
+        if self.job_running():
+            return
+        self.email_mode = 'pitch' if self.core_pitch_var.get() else 'full'
+        resume = False
+        if self.has_unfinished_run(vc_websites, max_depth):
+            resume = messagebox.askyesno(
+                "Resume", "A previous run for these URLs didn't finish. Resume it and skip the startups, "
+                          "emails and drafts it already completed?\n\nChoose No to start over.")
+        self.clear_log()
+        self.start_job("Searching startups...", self.search_and_generate_job, vc_websites, max_depth, regenerate,
+                       self.skip_contacted_var.get(), self.stream_var.get(), resume)
+
+    def search_and_generate_job(self, vc_websites: List[str], max_depth: int = 0, regenerate=False,
+                                skip_contacted: bool = True, stream: bool = False, resume: bool = False):
+        """Background job: crawl the VC portfolios (or resume a journaled run), then generate an email per startup"""
+        try:
+            def show_page(url, startups):
+                self.jobs.post(self.set_status, f"Searching startups... found {len(startups)} on {url}")
+
+            startups = self.crawl_or_resume(vc_websites, max_depth=max_depth, resume=resume,
+                                            cancel_event=self.jobs.cancel_event, on_page=show_page)
+            if self.jobs.is_cancelled():
+                self.jobs.post(self.set_status, "Cancelled")
+                return
+            if not startups:
+                self.jobs.post(messagebox.showerror, "Error", "No startups found. Please check the VC website URL.")
+                self.jobs.post(self.set_status, "No startups found")
+                return
+
+            if skip_contacted:
+                startups, skipped = self.filter_new_startups(startups)
+                if skipped:
+                    self.jobs.post(self.append_result, f"Skipping {len(skipped)} companies already contacted: "
+                                                       f"{', '.join(startup['name'] for startup in skipped)}\n")
                 if not startups:
-                    print("Empty startups array returned")
-                    return self.create_fallback_startups(vc_website)
-                print(f"Successfully parsed {len(startups)} startups")
-                return startups
-            except json.JSONDecodeError as e:
-                print(f"JSON parsing error: {str(e)}")
-                print(f"Attempted to parse: {json_str[:200]}...")
-                return self.create_fallback_startups(vc_website)
-            
+                    self.jobs.post(self.set_status, "Every startup found has already been contacted")
+                    return
+            else:
+                self.tracker.record_startups(startups)
+
+            self.jobs.post(self.set_status, "Generating emails...")
+            self.jobs.post(self.append_result, f"Found {len(startups)} startups. Generating emails...\n\n")
+            self.jobs.post(self.clear_generated_emails)
+
+            completed = 0
+
+            def show_result(startup, email_data, error):
+                nonlocal completed
+                completed += 1
+                if error is not None:
+                    self.jobs.post(self.show_generation_error, startup['name'], error, self.stream_key(startup))
+                else:
+                    self.jobs.post(self.show_generated_email, email_data, self.stream_key(startup))
+                self.jobs.post(self.update_progress, completed, len(startups), f"Generating emails... ({completed}/{len(startups)})")
+
+            def show_token(startup, text):
+                self.jobs.post(self.stream_token, self.stream_key(startup), startup['name'], text)
+
+            # Emails stream in as they finish; keep the final list in portfolio order
+            generated = self.generate_emails_concurrently(startups, on_result=show_result, cancel_event=self.jobs.cancel_event,
+                                                          regenerate=regenerate, on_token=show_token if stream else None)
+            self.jobs.post(self.set_generated_emails, generated)
+
+            if self.jobs.is_cancelled():
+                self.jobs.post(self.set_status, f"Cancelled after generating {len(generated)} emails")
+            else:
+                self.jobs.post(self.set_status, "Email generation complete! Now authenticate Gmail to create drafts.")
         except Exception as e:
-            print(f"Error scraping VC website: {str(e)}")
-            return []
+            self.jobs.post(messagebox.showerror, "Error", f"An error occurred: {str(e)}")
+            self.jobs.post(self.set_status, "Error occurred")
 
-    def create_fallback_startups(self, vc_website: str) -> List[Dict]:
-        """
-        Create fallback startup data when scraping fails.
-        Uses known startups from major VC firms.
-        """
-        # Determine which VC firm based on URL
-        vc_website_lower = vc_website.lower()
-        
-        fallback_data = []
-        
-        if 'sequoia' in vc_website_lower:
-            fallback_data = [
-                {"name": "Stripe", "website": "https://stripe.com", "industry": "Fintech", "stage": "Late Stage", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@stripe.com", "contact_linkedin": ""},
-                {"name": "DoorDash", "website": "https://doordash.com", "industry": "Food Delivery", "stage": "Public", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@doordash.com", "contact_linkedin": ""},
-                {"name": "Instacart", "website": "https://instacart.com", "industry": "Grocery Delivery", "stage": "Late Stage", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@instacart.com", "contact_linkedin": ""},
-                {"name": "Databricks", "website": "https://databricks.com", "industry": "Data Analytics", "stage": "Late Stage", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@databricks.com", "contact_linkedin": ""},
-                {"name": "Navan", "website": "https://navan.com", "industry": "Travel Tech", "stage": "Series G", "location": "Palo Alto, CA", "contact_name": "Hiring Manager", "contact_email": "careers@navan.com", "contact_linkedin": ""},
-            ]
-        elif 'ycombinator' in vc_website_lower or 'yc' in vc_website_lower:
-            fallback_data = [
-                {"name": "Airbnb", "website": "https://airbnb.com", "industry": "Hospitality", "stage": "Public", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@airbnb.com", "contact_linkedin": ""},
-                {"name": "Coinbase", "website": "https://coinbase.com", "industry": "Cryptocurrency", "stage": "Public", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@coinbase.com", "contact_linkedin": ""},
-                {"name": "Reddit", "website": "https://reddit.com", "industry": "Social Media", "stage": "Public", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@reddit.com", "contact_linkedin": ""},
-                {"name": "Instacart", "website": "https://instacart.com", "industry": "Grocery Delivery", "stage": "Late Stage", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@instacart.com", "contact_linkedin": ""},
-                {"name": "Brex", "website": "https://brex.com", "industry": "Fintech", "stage": "Series D", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@brex.com", "contact_linkedin": ""},
-            ]
-        elif 'a16z' in vc_website_lower or 'andreessen' in vc_website_lower:
-            fallback_data = [
-                {"name": "GitHub", "website": "https://github.com", "industry": "Developer Tools", "stage": "Acquired", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@github.com", "contact_linkedin": ""},
-                {"name": "Coinbase", "website": "https://coinbase.com", "industry": "Cryptocurrency", "stage": "Public", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@coinbase.com", "contact_linkedin": ""},
-                {"name": "Roblox", "website": "https://roblox.com", "industry": "Gaming", "stage": "Public", "location": "San Mateo, CA", "contact_name": "Hiring Manager", "contact_email": "careers@roblox.com", "contact_linkedin": ""},
-                {"name": "Instacart", "website": "https://instacart.com", "industry": "Grocery Delivery", "stage": "Late Stage", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@instacart.com", "contact_linkedin": ""},
-                {"name": "Dialpad", "website": "https://dialpad.com", "industry": "Communication", "stage": "Series E", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@dialpad.com", "contact_linkedin": ""},
-            ]
-        else:
-            # Generic tech startups
-            fallback_data = [
-                {"name": "Sample Startup 1", "website": "https://example1.com", "industry": "Software", "stage": "Series A", "location": "San Francisco, CA", "contact_name": "Hiring Manager", "contact_email": "careers@example1.com", "contact_linkedin": ""},
-                {"name": "Sample Startup 2", "website": "https://example2.com", "industry": "AI/ML", "stage": "Seed", "location": "New York, NY", "contact_name": "Hiring Manager", "contact_email": "careers@example2.com", "contact_linkedin": ""},
-                {"name": "Sample Startup 3", "website": "https://example3.com", "industry": "Fintech", "stage": "Series B", "location": "Austin, TX", "contact_name": "Hiring Manager", "contact_email": "careers@example3.com", "contact_linkedin": ""},
-            ]
-        
-        print(f"Using fallback data with {len(fallback_data)} startups")
-        return fallback_data
+    def start_job(self, status: str, target, *args):
+        """Run a long task in the background with progress reporting and cancellation"""
+        if self.job_running():
+            return
+        self.set_status(status)
+        self.update_progress(0, 1)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.metrics.start_run(target.__name__)
+        self.jobs.submit(target, *args, on_done=self.job_finished)
 
-    def generate_cold_email(self, startup_info: Dict) -> str:
-        """
-        Generate a personalized cold email for a new grad position using user information.
-        """
-        if not all(self.user_info.values()):
-            raise ValueError("Please fill in all your profile information first")
+    def job_running(self) -> bool:
+        """True (after telling the user) if another task is still running"""
+        if self.jobs.is_running():
+            messagebox.showerror("Error", "Another task is still running. Cancel it or wait for it to finish.")
+            return True
+        return False
 
-        contact_name = startup_info.get('contact_name', 'Hiring Manager')
-        contact_email = startup_info.get('contact_email', '')
-        contact_linkedin = startup_info.get('contact_linkedin', '')
+    def cancel_job(self):
+        self.jobs.cancel()
+        self.set_status("Cancelling...")
 
-        if contact_name.lower() != 'hiring manager':
-            salutation = f"Dear {contact_name},"
-        else:
-            salutation = "Dear Hiring Team,"
+    def job_finished(self):
+        self.cancel_button.config(state=tk.DISABLED)
+        summary = self.metrics.finish_run()
+        print(summary)
+        self.append_result("\n" + summary + "\n")
 
-        prompt = (
-            "Write a professional cold email for a new grad entry-level position. Include these details:\n"
-            f"Startup: {startup_info['name']}\n"
-            f"Industry: {startup_info.get('industry', 'Tech')}\n"
-            f"Location: {startup_info.get('location', 'Remote')}\n"
-            f"Contact Person: {contact_name}\n"
-            f"Contact Email: {contact_email}\n"
-            "\n"
-            "The email should be personalized and include:\n"
-            "1. A brief introduction as a recent graduate\n"
-            "2. Why you're interested in the startup\n"
-            "3. Relevant skills and experience from your degree\n"
-            "4. How you can contribute to their early-stage company\n"
-            "5. A professional closing\n"
-            "\n"
-            "Use this information about the candidate:\n"
-            f"Name: {self.user_info['name']}\n"
-            f"Degree: {self.user_info['degree']}\n"
-            f"Graduation Year: {self.user_info['graduation_year']}\n"
-            f"Skills: {self.user_info['skills']}\n"
-            f"Achievements: {self.user_info['achievements']}\n"
-            f"Location: {self.user_info['location']}\n"
-            "\n"
-            "Make it concise but impactful (3-4 paragraphs)."
-        )
+    # UI update helpers. Background jobs reach these through self.jobs.post().
 
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=500
-        )
-        
-        email_content = response.choices[0].message.content
-        
-        email_footer = f"\n\nContact Information:\n"\
-                     f"Startup: {startup_info['name']}\n"\
-                     f"Website: {startup_info['website']}\n"\
-                     f"Contact Person: {contact_name}\n"\
-                     f"Contact Email: {contact_email}\n"\
-                     f"LinkedIn: {contact_linkedin}"
-        
-        return salutation + "\n\n" + email_content + "\n\n" + email_footer
+    def set_status(self, text: str):
+        self.status_label.config(text=text)
 
-    def search_startups_and_generate_emails(self):
-        """
-        Main function to scrape startups and generate cold emails for new grad positions.
-        """
-        try:
-            vc_website = self.url_entry.get()
-            if not vc_website:
-                messagebox.showerror("Error", "Please enter a VC website URL")
-                return
+    def update_progress(self, done: int, total: int, text: str = None):
+        self.progress_bar.config(maximum=max(total, 1), value=done)
+        if text:
+            self.status_label.config(text=text)
 
-            self.status_label.config(text="Searching startups...")
-            self.window.update()
+    def append_result(self, text: str):
+        """Add a message to the run log, keeping only its last RESULTS_LOG_LINES lines"""
+        self.log_text.config(state=tk.NORMAL)
+        self.log_text.insert(tk.END, text)
+        lines = int(self.log_text.index('end-1c').split('.')[0])
+        if lines > RESULTS_LOG_LINES:
+            self.log_text.delete('1.0', f"{lines - RESULTS_LOG_LINES + 1}.0")
+        self.log_text.see(tk.END)
+        self.log_text.config(state=tk.DISABLED)
 
-            startups = self.scrape_vc_startups(vc_website)
-            if not startups:
-                messagebox.showerror("Error", "No startups found. Please check the VC website URL.")
-                return
+    def clear_log(self):
+        self.log_text.config(state=tk.NORMAL)
+        self.log_text.delete('1.0', tk.END)
+        self.log_text.config(state=tk.DISABLED)
 
-            self.status_label.config(text="Generating emails...")
-            self.window.update()
+    @staticmethod
+    def stream_key(startup: Dict) -> str:
+        """Results are keyed like the tracker, so a row's details can be loaded from it"""
+        return ApplicationTracker.company_key(startup['name'], startup.get('website', ''))
 
-            self.results_text.delete(1.0, tk.END)
-            self.results_text.insert(tk.END, f"Found {len(startups)} startups. Generating emails...\n\n")
+    def result_matches(self, row: Dict) -> bool:
+        status = RESULT_FILTERS.get(self.status_filter_var.get())
+        if status is not None and row['status'] != status:
+            return False
+        search = self.search_var.get().strip().lower()
+        return not search or search in row['company'].lower() or search in row['to_email'].lower()
 
-            self.generated_emails = []  # Clear previous emails
+    def schedule_results_refresh(self):
+        """Filter once typing pauses rather than on every keystroke"""
+        if self.results_refresh_pending is not None:
+            self.window.after_cancel(self.results_refresh_pending)
+        self.results_refresh_pending = self.window.after(RESULTS_SEARCH_DELAY_MS, self.refresh_results)
 
-            for startup in startups:
-                try:
-                    email = self.generate_cold_email(startup)
-                    
-                    # Store email data for draft creation
-                    contact_email = startup.get('contact_email', '')
-                    if not contact_email:
-                        contact_email = f"careers@{startup.get('website', 'example.com').replace('https://', '').replace('http://', '').split('/')[0]}"
-                    
-                    subject = f"New Graduate Interested in {startup['name']} - {self.user_info['degree']}"
-                    
-                    self.generated_emails.append({
-                        'startup_name': startup['name'],
-                        'to_email': contact_email,
-                        'subject': subject,
-                        'body': email
-                    })
-                    
-                    self.results_text.insert(tk.END, f"\nEmail for {startup['name']}:\n")
-                    self.results_text.insert(tk.END, f"To: {contact_email}\n")
-                    self.results_text.insert(tk.END, f"Subject: {subject}\n")
-                    self.results_text.insert(tk.END, "-" * 80 + "\n")
-                    self.results_text.insert(tk.END, email + "\n")
-                    self.results_text.insert(tk.END, "-" * 80 + "\n")
-                except Exception as e:
-                    self.results_text.insert(tk.END, f"Error generating email for {startup['name']}: {str(e)}\n")
+    def load_result_rows(self, rows: List[tuple]):
+        """Replace the list's rows with (key, company, status, to_email) rows from the tracker"""
+        self.result_rows = {}
+        for key, company, status, to_email in rows:
+            self.result_rows[key] = {'key': key, 'company': company, 'status': status, 'to_email': to_email or ''}
 
-            self.status_label.config(text="Email generation complete! Now authenticate Gmail to create drafts.")
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
-            self.status_label.config(text="Error occurred")
+    def reload_results(self, rows: List[tuple]):
+        self.load_result_rows(rows)
+        self.refresh_results()
+
+    def refresh_results(self):
+        """Rebuild the list from the rows matching the filters, showing at most RESULTS_MAX_ROWS"""
+        self.results_refresh_pending = None
+        selected = self.selected_result()
+        self.results_list.delete(*self.results_list.get_children())
+        matching = [row for row in self.result_rows.values() if self.result_matches(row)]
+        for row in matching[:RESULTS_MAX_ROWS]:
+            self.results_list.insert('', tk.END, iid=row['key'], values=(row['company'], row['status'], row['to_email']))
+        self.visible_results = min(len(matching), RESULTS_MAX_ROWS)
+        if selected and self.results_list.exists(selected):
+            self.results_list.selection_set(selected)
+        elif selected:
+            self.show_result_detail(None)
+        self.update_results_count(len(matching))
+
+    def update_results_count(self, matching: int = None):
+        text = f"{self.visible_results} of {len(self.result_rows)} shown"
+        if matching is not None and matching > self.visible_results:
+            text += " (refine the search to see the rest)"
+        self.results_count_label.config(text=text)
+
+    def set_result_row(self, key: str, company: str, status: str, to_email: str = ''):
+        """Add or update one startup's row, keeping the visible list in step with the filters"""
+        row = self.result_rows.setdefault(key, {'key': key, 'company': company, 'to_email': ''})
+        row['status'] = status
+        row['to_email'] = to_email or row['to_email']
+        values = (row['company'], row['status'], row['to_email'])
+        if self.results_list.exists(key):
+            if self.result_matches(row):
+                self.results_list.item(key, values=values)
+            else:
+                self.results_list.delete(key)
+                self.visible_results -= 1
+        elif self.result_matches(row) and self.visible_results < RESULTS_MAX_ROWS:
+            self.results_list.insert('', tk.END, iid=key, values=values)
+            self.visible_results += 1
+        self.update_results_count()
+        if key == self.selected_result():
+            self.show_result_detail(key)
+
+    def selected_result(self):
+        selection = self.results_list.selection()
+        return selection[0] if selection else None
+
+    def set_detail_text(self, text: str):
+        self.detail_text.config(state=tk.NORMAL)
+        self.detail_text.delete('1.0', tk.END)
+        self.detail_text.insert('1.0', text)
+        self.detail_text.config(state=tk.DISABLED)
+
+    def show_result_detail(self, key: str):
+        """Show the selected email: live text while it streams, otherwise loaded from the tracker"""
+        if key is None:
+            self.set_detail_text("")
+            return
+        if key in self.stream_buffers:
+            self.set_detail_text(f"Writing email for {self.result_rows[key]['company']}...\n\n"
+                                 + ''.join(self.stream_buffers[key]))
+            return
+        application = self.tracker.get_application(key)
+        if application is None:
+            self.set_detail_text("")
+            return
+        text = f"Email for {application['company']}:\nStatus: {application['status']}\n"
+        if application['draft_id']:
+            text += f"Gmail draft: {application['draft_id']}\n"
+        if application['error'] and application['status'] == STATUS_FAILED:
+            text += f"Error: {application['error']}\n"
+        if application['body']:
+            text += (
+                f"To: {application['to_email']}\n"
+                f"Subject: {application['subject']}\n"
+                + "-" * 80 + "\n"
+                + application['body'] + "\n"
+            )
+        self.set_detail_text(text)
+
+    def stream_token(self, key: str, startup_name: str, text: str):
+        """Collect a streaming email's text; it is shown live while its row is selected"""
+        if key not in self.stream_buffers:
+            self.stream_buffers[key] = []
+            self.set_result_row(key, startup_name, STATUS_WRITING)
+        self.stream_buffers[key].append(text)
+        if key == self.selected_result():
+            self.detail_text.config(state=tk.NORMAL)
+            self.detail_text.insert(tk.END, text)
+            self.detail_text.config(state=tk.DISABLED)
+
+    def show_generated_email(self, email_data: Dict, key: str = None):
+        self.generated_emails.append(email_data)
+        key = key or ApplicationTracker.company_key(email_data['startup_name'], email_data.get('website', ''))
+        self.stream_buffers.pop(key, None)
+        status = STATUS_DRAFTED if email_data.get('draft_id') else STATUS_GENERATED
+        self.set_result_row(key, email_data['startup_name'], status, email_data['to_email'])
+
+    def show_generation_error(self, startup_name: str, error: Exception, key: str = None):
+        key = key or ApplicationTracker.company_key(startup_name)
+        self.stream_buffers.pop(key, None)
+        self.set_result_row(key, startup_name, STATUS_FAILED)
+        self.append_result(f"Error generating email for {startup_name}: {str(error)}\n")
+
+    def show_draft_result(self, email_data: Dict, error: Exception):
+        key = ApplicationTracker.company_key(email_data['startup_name'], email_data.get('website', ''))
+        if error is None:
+            self.set_result_row(key, email_data['startup_name'], STATUS_DRAFTED)
+        else:
+            self.set_result_row(key, email_data['startup_name'], STATUS_FAILED)
+            self.append_result(f"✗ Failed to create draft for {email_data['startup_name']}: {str(error)}\n")
+
+    def clear_generated_emails(self):
+        self.generated_emails = []  # Clear previous emails
+
+    def set_generated_emails(self, emails: List[Dict]):
+        self.generated_emails = emails
 
     def run(self):
         self.window.mainloop()
 
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="New grad cold email agent. Starts the GUI unless --headless is given.")
+    parser.add_argument('--headless', action='store_true', help="run the pipeline without a window")
+    parser.add_argument('--profile', help="JSON file with name, degree, graduation_year, skills, achievements, location")
+    parser.add_argument('--urls', help="text file with one VC portfolio URL per line")
+    parser.add_argument('--output', default='emails.jsonl', help="where to write generated emails (JSON lines)")
+    parser.add_argument('--drafts', action='store_true', help="also create Gmail drafts (needs an existing token.pickle)")
+    parser.add_argument('--depth', type=int, help="pagination links to follow per URL")
+    parser.add_argument('--workers', type=int, help="emails generated in parallel")
+    parser.add_argument('--regenerate', nargs='*', metavar='STARTUP',
+                        help="ignore saved emails: for the named startups, or for all if no names are given")
+    parser.add_argument('--include-contacted', action='store_true',
+                        help="also email companies the tracker marks as already contacted")
+    parser.add_argument('--import-xlsx', metavar='PATH', help="merge an Excel tracker into applications.db first")
+    parser.add_argument('--export-xlsx', metavar='PATH', help="write applications.db to an Excel tracker at the end")
+    parser.add_argument('--batch', action='store_true',
+                        help="generate emails with the OpenAI Batch API (cheaper, can take hours; resumable)")
+    parser.add_argument('--batch-state', default=BATCH_STATE_PATH, metavar='PATH',
+                        help="where batch progress is saved so an interrupted --batch run can resume")
+    parser.add_argument('--core-pitch', action='store_true',
+                        help="write one core pitch per profile and personalize only a short paragraph per startup")
+    parser.add_argument('--fresh', action='store_true',
+                        help="start over instead of resuming an interrupted run for the same URLs")
+    args = parser.parse_args(argv)
+
+    if args.import_xlsx or args.export_xlsx:
+        args.headless = True
+    if not args.headless:
+        if tk is None:
+            parser.error("Tk is not available; use --headless")
+        agent = NewGradJobAgent()
+        agent.run()
+        return 0
+
+    tracker_only = (args.import_xlsx or args.export_xlsx) and not args.urls
+    if not tracker_only and (not args.profile or not args.urls):
+        parser.error("--headless requires --profile and --urls")
+
+    pipeline = JobPipeline()
+    if args.workers:
+        pipeline.email_workers = max(1, args.workers)
+    if args.core_pitch:
+        pipeline.email_mode = 'pitch'
+    try:
+        if args.import_xlsx:
+            print(f"Imported {pipeline.tracker.import_xlsx(args.import_xlsx)} applications from {args.import_xlsx}")
+        if tracker_only:
+            if args.export_xlsx:
+                print(f"Exported {pipeline.tracker.export_xlsx(args.export_xlsx)} applications to {args.export_xlsx}")
+            return 0
+
+        pipeline.load_profile(args.profile)
+        vc_websites = pipeline.load_url_list(args.urls)
+        if not vc_websites:
+            raise ValueError(f"No URLs found in {args.urls}")
+        if args.regenerate is None:
+            regenerate = False
+        else:
+            regenerate = args.regenerate or True
+        succeeded = pipeline.run_headless(vc_websites, args.output, create_drafts=args.drafts, max_depth=args.depth,
+                                          regenerate=regenerate, skip_contacted=not args.include_contacted,
+                                          use_batch=args.batch, batch_state=args.batch_state, resume=not args.fresh)
+        if args.export_xlsx:
+            print(f"Exported {pipeline.tracker.export_xlsx(args.export_xlsx)} applications to {args.export_xlsx}")
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return 1
+    return 0 if succeeded else 1
+
 if __name__ == "__main__":
-    agent = NewGradJobAgent()
-    agent.run()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,266 @@
+"""
+Tests for Batch API email generation (JobPipeline.generate_emails_batch) against a
+local stand-in for the OpenAI files/batches client. Run with: python -m pytest
+"""
+import json
+import os
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+import internship_agent
+
+
+PROFILE = {
+    'name': 'Alex Chen',
+    'degree': 'B.S. Computer Science',
+    'graduation_year': '2025',
+    'skills': 'Python, distributed systems',
+    'achievements': 'Built a search engine',
+    'location': 'San Francisco, CA',
+}
+
+STARTUPS = [
+    {'name': f"Company {i}", 'website': f"https://company{i}.com", 'industry': 'Fintech',
+     'location': 'New York, NY', 'contact_name': 'Hiring Manager', 'contact_email': f"careers@company{i}.com",
+     'contact_linkedin': ''}
+    for i in range(4)
+]
+
+
+class FakeFiles:
+    def __init__(self):
+        self.store = {}
+
+    def create(self, file, purpose):
+        file_id = f"file-{len(self.store)}"
+        self.store[file_id] = file.read().decode('utf-8')
+        return SimpleNamespace(id=file_id)
+
+    def content(self, file_id):
+        return SimpleNamespace(text=self.store[file_id])
+
+    def requests(self, file_id):
+        return [json.loads(line) for line in self.store[file_id].splitlines() if line.strip()]
+
+
+class FakeBatches:
+    """
+    Batches that report the given statuses one poll at a time, ending in final_status.
+    respond(request) builds each output line; return None to leave a request out.
+    """
+    def __init__(self, files: FakeFiles, statuses=('validating', 'in_progress'), final_status='completed',
+                 respond=None):
+        self.files = files
+        self.statuses = list(statuses)
+        self.final_status = final_status
+        self.respond = respond or ok_line
+        self.batches = {}
+        self.created = 0
+        self.crash_on_retrieve = False
+        self.transient_errors = 0
+
+    def create(self, input_file_id, endpoint, completion_window):
+        self.created += 1
+        batch_id = f"batch-{len(self.batches)}"
+        self.batches[batch_id] = {'input': input_file_id, 'polls': 0}
+        return SimpleNamespace(id=batch_id, status='validating')
+
+    def retrieve(self, batch_id):
+        if self.crash_on_retrieve:
+            raise KeyboardInterrupt("simulated crash while polling")
+        if self.transient_errors:
+            self.transient_errors -= 1
+            raise openai.APIConnectionError(request=httpx.Request('GET', f"https://api.openai.com/v1/batches/{batch_id}"))
+        batch = self.batches[batch_id]
+        batch['polls'] += 1
+        if batch['polls'] <= len(self.statuses):
+            counts = SimpleNamespace(completed=0, total=len(self.files.requests(batch['input'])))
+            return SimpleNamespace(id=batch_id, status=self.statuses[batch['polls'] - 1], request_counts=counts)
+        if self.final_status != 'completed':
+            return SimpleNamespace(id=batch_id, status=self.final_status, output_file_id=None, error_file_id=None)
+        lines = [self.respond(request) for request in self.files.requests(batch['input'])]
+        # The Batch API doesn't keep input order, so neither does the stand-in
+        lines = [line for line in reversed(lines) if line is not None]
+        output_id = f"file-{len(self.files.store)}"
+        self.files.store[output_id] = '\n'.join(json.dumps(line) for line in lines)
+        return SimpleNamespace(id=batch_id, status='completed', output_file_id=output_id, error_file_id=None)
+
+
+def ok_line(request):
+    return {
+        'custom_id': request['custom_id'],
+        'error': None,
+        'response': {'status_code': 200, 'body': {
+            'choices': [{'message': {'content': f"Email body for {request['custom_id']}"}}],
+            'usage': {'prompt_tokens': 100, 'completion_tokens': 50},
+        }},
+    }
+
+
+class FakeChatCompletions:
+    """Answers the core pitch request in 'pitch' mode"""
+    def __init__(self):
+        self.calls = 0
+        self.with_raw_response = self
+
+    def create(self, **request):
+        self.calls += 1
+        message = SimpleNamespace(content="Core pitch paragraph.")
+        response = SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason='stop')],
+                                   usage=SimpleNamespace(prompt_tokens=100, completion_tokens=20))
+        return SimpleNamespace(headers={}, parse=lambda: response)
+
+
+def make_client(**batch_options):
+    files = FakeFiles()
+    return SimpleNamespace(files=files, batches=FakeBatches(files, **batch_options),
+                           chat=SimpleNamespace(completions=FakeChatCompletions()),
+                           RateLimitError=openai.RateLimitError, APIConnectionError=openai.APIConnectionError,
+                           InternalServerError=openai.InternalServerError)
+
+
+@pytest.fixture
+def pipeline_factory(tmp_path, monkeypatch):
+    """Pipelines whose cache, tracker, journal and metrics live in tmp_path"""
+    monkeypatch.setenv('CACHE_PATH', str(tmp_path / 'cache.db'))
+    monkeypatch.setenv('TRACKER_PATH', str(tmp_path / 'applications.db'))
+    monkeypatch.setenv('JOURNAL_PATH', str(tmp_path / 'runs.db'))
+    monkeypatch.setenv('METRICS_PATH', str(tmp_path / 'metrics.jsonl'))
+    monkeypatch.setenv('EMAIL_MODE', 'full')
+
+    def make():
+        pipeline = internship_agent.JobPipeline()
+        pipeline.user_info = dict(PROFILE)
+        return pipeline
+    return make
+
+
+@pytest.fixture
+def state_path(tmp_path):
+    return str(tmp_path / 'batch_state.json')
+
+
+def run_batch(pipeline, client, state_path, startups=STARTUPS):
+    reported = []
+    emails = pipeline.generate_emails_batch(
+        startups, state_path=state_path, client=client, poll_interval=0,
+        on_result=lambda startup, email_data, error: reported.append((startup['name'], email_data, error)))
+    return emails, reported
+
+
+def test_submit_poll_and_map_results_back_to_startups(pipeline_factory, state_path):
+    client = make_client()
+    emails, reported = run_batch(pipeline_factory(), client, state_path)
+
+    assert client.batches.created == 1
+    assert client.batches.batches['batch-0']['polls'] == 3
+    requests = client.files.requests('file-0')
+    assert [request['custom_id'] for request in requests] == [f"email-{i}" for i in range(len(STARTUPS))]
+    assert all(request['url'] == '/v1/chat/completions' for request in requests)
+
+    # Output lines come back in reverse order but land on the right startup
+    assert [email['startup_name'] for email in emails] == [startup['name'] for startup in STARTUPS]
+    for index, email in enumerate(emails):
+        assert f"Email body for email-{index}" in email['body']
+        assert email['to_email'] == STARTUPS[index]['contact_email']
+    assert all(error is None for _, _, error in reported)
+
+    # A finished batch leaves nothing behind to resume
+    assert not os.path.exists(state_path)
+    assert not os.path.exists(os.path.splitext(state_path)[0] + '_input.jsonl')
+
+
+def test_resumes_submitted_batch_after_crash(pipeline_factory, state_path):
+    client = make_client()
+    client.batches.crash_on_retrieve = True
+    with pytest.raises(KeyboardInterrupt):
+        run_batch(pipeline_factory(), client, state_path)
+
+    with open(state_path, encoding='utf-8') as f:
+        state = json.load(f)
+    assert state['batch_id'] == 'batch-0'
+    assert state['pending'] == list(range(len(STARTUPS)))
+
+    # A new process polls the batch it already paid for instead of submitting another
+    client.batches.crash_on_retrieve = False
+    emails, _ = run_batch(pipeline_factory(), client, state_path)
+    assert client.batches.created == 1
+    assert [email['startup_name'] for email in emails] == [startup['name'] for startup in STARTUPS]
+    assert not os.path.exists(state_path)
+
+
+def test_state_from_another_job_is_ignored(pipeline_factory, state_path):
+    client = make_client()
+    client.batches.crash_on_retrieve = True
+    with pytest.raises(KeyboardInterrupt):
+        run_batch(pipeline_factory(), client, state_path, STARTUPS[:2])
+
+    client.batches.crash_on_retrieve = False
+    emails, _ = run_batch(pipeline_factory(), client, state_path, STARTUPS[2:])
+    assert client.batches.created == 2
+    assert [email['startup_name'] for email in emails] == [startup['name'] for startup in STARTUPS[2:]]
+
+
+def test_polling_survives_transient_errors(pipeline_factory, state_path):
+    client = make_client()
+    client.batches.transient_errors = 3
+    emails, _ = run_batch(pipeline_factory(), client, state_path)
+    assert client.batches.transient_errors == 0
+    assert len(emails) == len(STARTUPS)
+
+
+def test_pitch_mode_writes_core_pitch_through_injected_client(pipeline_factory, state_path, monkeypatch):
+    def no_real_client():
+        raise AssertionError("the real OpenAI client was used")
+    monkeypatch.setattr(internship_agent, 'load_openai', no_real_client)
+    pipeline = pipeline_factory()
+    pipeline.email_mode = 'pitch'
+    client = make_client()
+    emails, _ = run_batch(pipeline, client, state_path)
+    assert client.chat.completions.calls == 1
+    assert all("Core pitch paragraph." in email['body'] for email in emails)
+
+
+@pytest.mark.parametrize('status', ['failed', 'expired'])
+def test_failed_or_expired_batch_raises_and_clears_state(pipeline_factory, state_path, status):
+    client = make_client(final_status=status)
+    with pytest.raises(RuntimeError, match=status):
+        run_batch(pipeline_factory(), client, state_path)
+    assert not os.path.exists(state_path)
+
+    # The next run submits a fresh batch rather than polling the dead one
+    client.batches.final_status = 'completed'
+    emails, _ = run_batch(pipeline_factory(), client, state_path)
+    assert client.batches.created == 2
+    assert len(emails) == len(STARTUPS)
+
+
+def test_per_request_errors_are_reported_per_startup(pipeline_factory, state_path):
+    def respond(request):
+        if request['custom_id'] == 'email-0':
+            return {'custom_id': 'email-0', 'error': {'code': 'server_error', 'message': 'boom'}, 'response': None}
+        if request['custom_id'] == 'email-1':
+            return {'custom_id': 'email-1', 'error': None,
+                    'response': {'status_code': 429, 'body': {'error': {'message': 'rate limited'}}}}
+        if request['custom_id'] == 'email-2':
+            return None
+        return ok_line(request)
+
+    pipeline = pipeline_factory()
+    emails, reported = run_batch(pipeline, make_client(respond=respond), state_path)
+
+    assert [email['startup_name'] for email in emails] == ['Company 3']
+    errors = {name: error for name, _, error in reported}
+    assert 'boom' in str(errors['Company 0'])
+    assert 'rate limited' in str(errors['Company 1'])
+    assert 'No result' in str(errors['Company 2'])
+    assert errors['Company 3'] is None
+
+    # Only the successful email is cached; a re-run resubmits just the failures
+    client = make_client()
+    emails, _ = run_batch(pipeline, client, state_path)
+    assert len(emails) == len(STARTUPS)
+    assert [request['custom_id'] for request in client.files.requests('file-0')] == ['email-0', 'email-1', 'email-2']